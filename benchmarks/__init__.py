@@ -0,0 +1 @@
+"""Benchmarks for the Line Bot integration."""
@@ -0,0 +1,129 @@
+"""Minimal Home Assistant core to run the integration in benchmarks."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+import inspect
+import sys
+import tempfile
+from types import MappingProxyType
+from typing import Any
+from unittest.mock import patch
+
+from homeassistant import loader
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import (
+    area_registry,
+    device_registry,
+    entity,
+    entity_registry,
+    issue_registry,
+    translation,
+)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .mock_line import MockLineServer
+
+REPO_ROOT = __file__.rsplit("/benchmarks/", 1)[0]
+CHANNEL_SECRET = "bench-secret"
+
+
+class BenchHttp:
+    """Collect views instead of serving them, so they are called directly."""
+
+    def __init__(self) -> None:
+        """Initialize the collector."""
+        self.views: list[Any] = []
+
+    def register_view(self, view: Any) -> None:
+        """Keep a view."""
+        self.views.append(view)
+
+    def get_view(self, name: str) -> Any:
+        """Get a registered view by name."""
+        return next(view for view in self.views if view.name == name)
+
+
+@asynccontextmanager
+async def async_bench_hass() -> AsyncIterator[HomeAssistant]:
+    """Start a core with a temporary config directory and stop it afterwards.
+
+    Only the pieces the integration uses are set up. The http component is
+    replaced by BenchHttp.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        hass.http = BenchHttp()
+        loader.async_setup(hass)
+        hass.config.components.add("http")
+        translation.async_setup(hass)
+        entity.async_setup(hass)
+        for registry in (area_registry, device_registry, entity_registry):
+            await registry.async_load(hass)
+        await issue_registry.async_load(hass)
+        hass.config_entries = ConfigEntries(hass, {})
+        await hass.config_entries.async_initialize()
+        try:
+            yield hass
+        finally:
+            await hass.async_stop(force=True)
+
+
+@contextmanager
+def patch_client(server: MockLineServer) -> Iterator[None]:
+    """Make channels set up meanwhile talk to the mock API."""
+    from custom_components.line_bot.client import LineBotClient
+
+    def create_client(hass, access_token, metrics=None):
+        return LineBotClient(
+            async_get_clientsession(hass),
+            access_token,
+            endpoint=server.url,
+            data_endpoint=server.url,
+            metrics=metrics,
+        )
+
+    with patch("custom_components.line_bot.create_client", create_client):
+        yield
+
+
+def create_entry(**kwargs: Any) -> ConfigEntry:
+    """Create a config entry with the arguments the installed core requires."""
+    parameters = inspect.signature(ConfigEntry).parameters
+    kwargs.setdefault("unique_id", None)
+    if "discovery_keys" in parameters:
+        kwargs.setdefault("discovery_keys", MappingProxyType({}))
+    return ConfigEntry(**kwargs)
+
+
+async def async_add_channel(
+    hass: HomeAssistant,
+    server: MockLineServer,
+    chats: dict[str, str],
+    options: dict[str, Any],
+) -> ConfigEntry:
+    """Add and set up a channel whose client talks to the mock API."""
+    entry = create_entry(
+        version=1,
+        minor_version=1,
+        domain="line_bot",
+        title="Bench",
+        data={
+            "access_token": "bench-token",
+            "channel_secret": CHANNEL_SECRET,
+            "allowed_chat_ids": {
+                name: {"chat_id": chat_id} for name, chat_id in chats.items()
+            },
+        },
+        source="user",
+        options=options,
+    )
+    with patch_client(server):
+        await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+    return entry
@@ -0,0 +1,147 @@
+"""Local stand-in for the Line Messaging API."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+import json
+import random
+
+from aiohttp import web
+
+
+@dataclass
+class MockConfig:
+    """Behavior of the mock API.
+
+    Latency is in milliseconds. The ratios are the share of message
+    requests answered with 429 or 500.
+    """
+
+    latency: float = 20.0
+    jitter: float = 5.0
+    rate_limit_ratio: float = 0.0
+    error_ratio: float = 0.0
+    retry_after: float = 0.05
+    content_size: int = 256 * 1024
+    quota: int = 1_000_000
+    seed: int = 0
+
+
+class MockLineServer:
+    """Serve the endpoints the integration calls, on a local port.
+
+    Push, reply, multicast, broadcast and narrowcast requests are answered
+    after the configured latency, or fail with the configured ratios.
+    Quota, bot info and message content are always served.
+    """
+
+    def __init__(self, config: MockConfig) -> None:
+        """Initialize the server."""
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.requests: Counter[tuple[str, int]] = Counter()
+        self.messages = 0
+        self.url = ""
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Start listening, on a free port by default."""
+        app = web.Application()
+        app.router.add_post("/v2/bot/message/{kind}", self.handle_message)
+        app.router.add_get("/v2/bot/message/quota", self.handle_quota)
+        app.router.add_get("/v2/bot/message/quota/consumption", self.handle_consumption)
+        app.router.add_get("/v2/bot/info", self.handle_bot_info)
+        app.router.add_get("/v2/bot/profile/{user_id}", self.handle_profile)
+        app.router.add_get("/v2/bot/message/{message_id}/content", self.handle_content)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def reset(self) -> None:
+        """Forget the requests counted so far."""
+        self.requests.clear()
+        self.messages = 0
+
+    async def _delay(self) -> None:
+        delay = self.random.gauss(self.config.latency, self.config.jitter)
+        await asyncio.sleep(max(delay, 0) / 1000)
+
+    async def handle_message(self, request: web.Request) -> web.Response:
+        """Answer a request sending messages."""
+        kind = request.match_info["kind"]
+        body = json.loads(await request.read())
+        await self._delay()
+        roll = self.random.random()
+        if roll < self.config.rate_limit_ratio:
+            status = 429
+            response = web.json_response(
+                {"message": "The API rate limit has been exceeded. Try again later."},
+                status=status,
+                headers={"Retry-After": str(self.config.retry_after)},
+            )
+        elif roll < self.config.rate_limit_ratio + self.config.error_ratio:
+            status = 500
+            response = web.json_response(
+                {"message": "An error occurred in the internal server"}, status=status
+            )
+        else:
+            status = 200
+            response = web.json_response({})
+            # the quota counts recipients, whatever the number of messages
+            if kind == "push":
+                self.messages += 1
+            elif kind == "multicast":
+                self.messages += len(body["to"])
+        self.requests[(kind, status)] += 1
+        return response
+
+    async def handle_quota(self, request: web.Request) -> web.Response:
+        """Answer the monthly quota."""
+        self.requests[("quota", 200)] += 1
+        return web.json_response({"type": "limited", "value": self.config.quota})
+
+    async def handle_consumption(self, request: web.Request) -> web.Response:
+        """Answer the messages sent this month."""
+        self.requests[("quota/consumption", 200)] += 1
+        return web.json_response({"totalUsage": self.messages})
+
+    async def handle_bot_info(self, request: web.Request) -> web.Response:
+        """Answer the info of the bot."""
+        self.requests[("info", 200)] += 1
+        return web.json_response(
+            {"userId": "U" + "0" * 32, "basicId": "@bench", "displayName": "Bench"}
+        )
+
+    async def handle_profile(self, request: web.Request) -> web.Response:
+        """Answer the profile of a user."""
+        await self._delay()
+        self.requests[("profile", 200)] += 1
+        user_id = request.match_info["user_id"]
+        return web.json_response(
+            {"userId": user_id, "displayName": f"User {user_id[-4:]}"}
+        )
+
+    async def handle_content(self, request: web.Request) -> web.StreamResponse:
+        """Stream the content of a message."""
+        await self._delay()
+        self.requests[("content", 200)] += 1
+        response = web.StreamResponse(
+            headers={"Content-Type": "image/jpeg"},
+        )
+        response.content_length = self.config.content_size
+        await response.prepare(request)
+        chunk = b"\0" * 65536
+        remaining = self.config.content_size
+        while remaining > 0:
+            await response.write(chunk[:remaining])
+            remaining -= len(chunk)
+        await response.write_eof()
+        return response
@@ -0,0 +1,454 @@
+"""Run the Line Bot benchmarks.
+
+    python -m benchmarks.run [--scenarios push,webhook] [--json out.json]
+    python -m benchmarks.run --compare out.json
+
+See benchmarks/README.md for the scenarios and options.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+import json
+import logging
+import sys
+from textwrap import dedent
+import time
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .core import (
+    CHANNEL_SECRET,
+    REPO_ROOT,
+    async_add_channel,
+    async_bench_hass,
+    patch_client,
+)
+from .mock_line import MockConfig, MockLineServer
+from .stats import Result, async_measure_allocations, async_timed
+from .webhook import WebhookGenerator, make_chat_ids
+
+DOMAIN = "line_bot"
+TEXT_MESSAGE = {"type": "text", "text": "Benchmark message"}
+# Modules Home Assistant has loaded anyway by the time the integration is
+# imported, so only the integration's own import is timed.
+IMPORT_SCRIPT = dedent("""
+    import json, sys, time, tracemalloc
+    sys.path.insert(0, {root!r})
+    import homeassistant.components.http
+    import homeassistant.components.sensor
+    import homeassistant.helpers.config_validation
+    import homeassistant.helpers.update_coordinator
+    if {trace}:
+        tracemalloc.start()
+    start = time.perf_counter()
+    import custom_components.line_bot
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    print(json.dumps({{
+        "ms": elapsed * 1000,
+        "allocated": current / 1024,
+        "peak": peak / 1024,
+        "sdk_loaded": "linebot" in sys.modules,
+    }}))
+    """)
+
+
+@dataclass
+class Bench:
+    """Everything a scenario runs against."""
+
+    hass: HomeAssistant
+    entry: ConfigEntry
+    server: MockLineServer
+    chats: list[str]
+    webhooks: WebhookGenerator
+    args: argparse.Namespace
+
+    @property
+    def data(self) -> dict[str, Any]:
+        """Return the data of the channel."""
+        return self.hass.data[DOMAIN]["entry"][self.entry.entry_id]
+
+
+Outcome = tuple[int, list[float], dict[str, Any]]
+
+
+async def async_call_all(
+    calls: list[Awaitable[Any]], latencies: list[float]
+) -> dict[str, Any]:
+    """Run service calls concurrently, timing each one and counting failures."""
+    results = await asyncio.gather(
+        *(async_timed(call, latencies) for call in calls), return_exceptions=True
+    )
+    return {"failed": sum(isinstance(result, Exception) for result in results)}
+
+
+async def async_push(bench: Bench) -> Outcome:
+    """Push to the chats concurrently, like a burst of automations."""
+    latencies: list[float] = []
+    calls = [
+        bench.hass.services.async_call(
+            DOMAIN,
+            "send_message",
+            {"to": bench.chats[i % len(bench.chats)], "message": TEXT_MESSAGE},
+            blocking=True,
+        )
+        for i in range(bench.args.pushes)
+    ]
+    return len(calls), latencies, await async_call_all(calls, latencies)
+
+
+async def async_reply(bench: Bench) -> Outcome:
+    """Reply to as many reply tokens concurrently."""
+    latencies: list[float] = []
+    calls = [
+        bench.hass.services.async_call(
+            DOMAIN,
+            "send_message",
+            {"reply_token": f"{i:032x}", "message": TEXT_MESSAGE},
+            blocking=True,
+        )
+        for i in range(bench.args.pushes)
+    ]
+    return len(calls), latencies, await async_call_all(calls, latencies)
+
+
+async def async_conversation(bench: Bench) -> Outcome:
+    """Answer a message from every chat by sending to the chat.
+
+    With the prefer_reply option on, the webhook keeps the reply token of
+    each message, so the answers are replies. Latency is the time to
+    answer after the message was handled.
+    """
+    view = bench.hass.http.get_view("api:line_bot")
+    now = int(time.time() * 1000)
+    events = [
+        bench.webhooks.make_event(bench.data["chat_ids"][name], now)
+        for name in bench.chats
+    ]
+    await view.post(bench.webhooks.make_request(bench.webhooks.make_body(events)))
+    await bench.data["dispatcher"].queue.join()
+    replies = bench.server.requests[("reply", 200)]
+    latencies: list[float] = []
+    calls = [
+        bench.hass.services.async_call(
+            DOMAIN,
+            "send_message",
+            {"to": name, "message": TEXT_MESSAGE},
+            blocking=True,
+        )
+        for name in bench.chats
+    ]
+    extra = await async_call_all(calls, latencies)
+    extra["replied"] = bench.server.requests[("reply", 200)] - replies
+    return len(calls), latencies, extra
+
+
+async def async_multicast(bench: Bench) -> Outcome:
+    """Multicast to every chat, one round after the other."""
+    latencies: list[float] = []
+    failed = 0
+    for _ in range(bench.args.multicast_rounds):
+        failed += (
+            await async_call_all(
+                [
+                    bench.hass.services.async_call(
+                        DOMAIN,
+                        "send_multicast",
+                        {"to": bench.chats, "message": TEXT_MESSAGE},
+                        blocking=True,
+                        return_response=True,
+                    )
+                ],
+                latencies,
+            )
+        )["failed"]
+    return bench.args.multicast_rounds, latencies, {"failed": failed}
+
+
+async def async_webhook(bench: Bench) -> Outcome:
+    """Post signed batches to the webhook and wait until every event is handled.
+
+    Latency is the time to answer each request. The rate counts events from
+    the first request until the workers handled the last event.
+    """
+    view = bench.hass.http.get_view("api:line_bot")
+    dispatcher = bench.data["dispatcher"]
+    dropped = dispatcher.dropped
+    bodies = [
+        bench.webhooks.make_body(bench.args.events) for _ in range(bench.args.batches)
+    ]
+    requests = [bench.webhooks.make_request(body) for body in bodies]
+    latencies: list[float] = []
+    start = time.perf_counter()
+    for request in requests:
+        await async_timed(view.post(request), latencies)
+    posted = time.perf_counter() - start
+    await dispatcher.queue.join()
+    events = bench.args.batches * bench.args.events
+    return (
+        events,
+        latencies,
+        {
+            "ingest_rate": events / posted if posted else 0.0,
+            "dropped": dispatcher.dropped - dropped,
+        },
+    )
+
+
+async def async_content(bench: Bench) -> Outcome:
+    """Download the content of as many messages concurrently."""
+    latencies: list[float] = []
+    base = int(time.time() * 1000)
+    calls = [
+        bench.hass.services.async_call(
+            DOMAIN,
+            "get_message_content",
+            {"message_id": str(base + i)},
+            blocking=True,
+            return_response=True,
+        )
+        for i in range(bench.args.contents)
+    ]
+    return len(calls), latencies, await async_call_all(calls, latencies)
+
+
+async def async_import_once(trace: bool) -> dict[str, Any]:
+    """Import the integration in a fresh interpreter."""
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        IMPORT_SCRIPT.format(root=REPO_ROOT, trace=trace),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    stdout, _ = await process.communicate()
+    if process.returncode:
+        raise RuntimeError("Importing the integration failed")
+    return json.loads(stdout)
+
+
+async def async_import(bench: Bench) -> Outcome:
+    """Time importing the integration, each time in a fresh interpreter.
+
+    Allocations are traced in the interpreter importing it, on one more
+    import.
+    """
+    runs = [await async_import_once(False) for _ in range(bench.args.import_runs)]
+    traced = await async_import_once(True)
+    return (
+        len(runs),
+        [run["ms"] for run in runs],
+        {
+            "allocated": traced["allocated"],
+            "peak": traced["peak"],
+            "sdk_loaded": traced["sdk_loaded"],
+        },
+    )
+
+
+async def async_setup(bench: Bench) -> Outcome:
+    """Time setting up the config entry again, after unloading it."""
+    entries = bench.hass.config_entries
+    latencies: list[float] = []
+    for _ in range(bench.args.setup_runs):
+        await entries.async_unload(bench.entry.entry_id)
+        with patch_client(bench.server):
+            await async_timed(entries.async_setup(bench.entry.entry_id), latencies)
+    return bench.args.setup_runs, latencies, {}
+
+
+SCENARIOS: dict[str, Callable[[Bench], Awaitable[Outcome]]] = {
+    "import": async_import,
+    "setup": async_setup,
+    "push": async_push,
+    "reply": async_reply,
+    "conversation": async_conversation,
+    "multicast": async_multicast,
+    "webhook": async_webhook,
+    "content": async_content,
+}
+
+
+async def async_run_scenario(bench: Bench, name: str) -> Result:
+    """Run a scenario once timed, then once more under tracemalloc."""
+    scenario = SCENARIOS[name]
+    bench.server.reset()
+    start = time.perf_counter()
+    count, latencies, extra = await scenario(bench)
+    wall = time.perf_counter() - start
+    await bench.hass.async_block_till_done()
+    extra["requests"] = {
+        f"{kind} {status}": requests
+        for (kind, status), requests in sorted(bench.server.requests.items())
+    }
+    result = Result(name, count, wall, latencies, extra=extra)
+    if name == "import":
+        result.allocated = extra.pop("allocated")
+        result.peak = extra.pop("peak")
+    elif not bench.args.no_alloc:
+        result.allocated, result.peak = await async_measure_allocations(
+            lambda: scenario(bench)
+        )
+        await bench.hass.async_block_till_done()
+    return result
+
+
+async def async_main(args: argparse.Namespace) -> list[Result]:
+    """Set up a channel against the mock API and run the scenarios."""
+    server = MockLineServer(
+        MockConfig(
+            latency=args.latency,
+            jitter=args.jitter,
+            rate_limit_ratio=args.rate_limit_ratio,
+            error_ratio=args.error_ratio,
+            retry_after=args.retry_after,
+            content_size=args.content_size,
+            seed=args.seed,
+        )
+    )
+    await server.start()
+    chat_ids = make_chat_ids(args.chats)
+    chats = {f"chat{i}": chat_id for i, chat_id in enumerate(chat_ids)}
+    options = {
+        key: value
+        for key, value in (
+            ("rate_limit", args.rate_limit),
+            ("coalesce_window", args.coalesce_window),
+            ("workers", args.workers),
+            ("queue_size", args.queue_size),
+            ("prefer_reply", args.prefer_reply),
+            ("fetch_profiles", args.fetch_profiles),
+        )
+        if value is not None
+    }
+    try:
+        async with async_bench_hass() as hass:
+            entry = await async_add_channel(hass, server, chats, options)
+            bench = Bench(
+                hass,
+                entry,
+                server,
+                list(chats),
+                WebhookGenerator(
+                    CHANNEL_SECRET, chat_ids, args.redelivery_ratio, args.seed
+                ),
+                args,
+            )
+            results = [await async_run_scenario(bench, name) for name in args.scenarios]
+            await hass.config_entries.async_unload(entry.entry_id)
+    finally:
+        await server.stop()
+    return results
+
+
+def print_results(results: list[Result]) -> None:
+    """Print a table of results."""
+    print(
+        f"{'scenario':<10} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'per sec':>10} {'alloc KiB':>10} {'peak KiB':>10}"
+    )
+    for result in results:
+        print(
+            f"{result.name:<10} {result.count:>7} {result.p50:>9.2f} "
+            f"{result.p99:>9.2f} {result.rate:>10.1f} {result.allocated:>10.1f} "
+            f"{result.peak:>10.1f}"
+        )
+    for result in results:
+        print(f"  {result.name}: {json.dumps(result.extra)}")
+
+
+def compare(results: list[Result], baseline: dict[str, Any], tolerance: float) -> int:
+    """Compare results with a baseline, returning the number of regressions.
+
+    A scenario regressed when its p99 latency or peak allocations grew, or
+    its rate dropped, by more than `tolerance` percent.
+    """
+    regressions = 0
+    limit = 1 + tolerance / 100
+    for result in results:
+        if (base := baseline.get(result.name)) is None:
+            continue
+        checks = (
+            ("p99", result.p99, base["p99"], result.p99 > base["p99"] * limit),
+            ("rate", result.rate, base["rate"], result.rate * limit < base["rate"]),
+            ("peak", result.peak, base["peak"], result.peak > base["peak"] * limit),
+        )
+        for metric, value, base_value, regressed in checks:
+            if regressed and base_value:
+                regressions += 1
+                print(
+                    f"REGRESSION {result.name} {metric}: "
+                    f"{base_value:.2f} -> {value:.2f}"
+                )
+    return regressions
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=list(SCENARIOS),
+        help=f"comma separated scenarios out of {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--setup-runs", type=int, default=10)
+    parser.add_argument("--pushes", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--multicast-rounds", type=int, default=20)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--events", type=int, default=10, help="events per batch")
+    parser.add_argument("--redelivery-ratio", type=float, default=0.0)
+    parser.add_argument("--contents", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=20.0, help="API ms")
+    parser.add_argument("--jitter", type=float, default=5.0, help="API ms")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--error-ratio", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.05, help="seconds")
+    parser.add_argument("--content-size", type=int, default=256 * 1024)
+    parser.add_argument("--rate-limit", type=int, help="option, requests per sec")
+    parser.add_argument("--coalesce-window", type=int, help="option, ms")
+    parser.add_argument("--workers", type=int, help="option")
+    parser.add_argument("--queue-size", type=int, help="option")
+    parser.add_argument(
+        "--prefer-reply", action=argparse.BooleanOptionalAction, help="option"
+    )
+    parser.add_argument(
+        "--fetch-profiles", action=argparse.BooleanOptionalAction, help="option"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-alloc", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--json", help="save the results to a file")
+    parser.add_argument("--compare", help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="percent")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if unknown := set(args.scenarios) - set(SCENARIOS):
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmarks from the command line."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    results = asyncio.run(async_main(args))
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({result.name: result.as_dict() for result in results}, file)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            return 1 if compare(results, json.load(file), args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
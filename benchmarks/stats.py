@@ -0,0 +1,91 @@
+"""Latency and allocation measurements for benchmarks."""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+import gc
+import time
+import tracemalloc
+from typing import Any
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get a percentile of values, interpolating between the closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@dataclass
+class Result:
+    """Measurements of a scenario.
+
+    Latencies are in milliseconds and allocations in KiB. `rate` is the
+    number of operations, or events for webhooks, per second of wall time.
+    """
+
+    name: str
+    count: int
+    wall: float
+    latencies: list[float] = field(default_factory=list, repr=False)
+    allocated: float = 0.0
+    peak: float = 0.0
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def p50(self) -> float:
+        """Return the median latency."""
+        return percentile(self.latencies, 0.5)
+
+    @property
+    def p99(self) -> float:
+        """Return the 99th percentile latency."""
+        return percentile(self.latencies, 0.99)
+
+    @property
+    def rate(self) -> float:
+        """Return operations per second."""
+        return self.count / self.wall if self.wall else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the summary of the result, without raw latencies."""
+        data = asdict(self)
+        del data["latencies"]
+        data.update(p50=self.p50, p99=self.p99, rate=self.rate)
+        return data
+
+
+async def async_timed(target: Awaitable[Any], latencies: list[float]) -> Any:
+    """Await a target and record its latency in milliseconds."""
+    start = time.perf_counter()
+    try:
+        return await target
+    finally:
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def async_measure_allocations(
+    run: Callable[[], Awaitable[Any]],
+) -> tuple[float, float]:
+    """Run a scenario under tracemalloc.
+
+    Returns the KiB still allocated after the run, and the peak KiB above
+    the memory in use before it. Tracing slows everything down, so it is
+    done on a separate run from the timed one.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await run()
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (after - before) / 1024, (peak - before) / 1024
@@ -1,47 +1,86 @@
 """The line_bot component."""
 
+from datetime import timedelta
+from functools import partial
 import logging
-
-from linebot.models import (
-    AudioSendMessage,
-    ButtonsTemplate,
-    ConfirmTemplate,
-    FlexSendMessage,
-    ImageSendMessage,
-    LocationSendMessage,
-    MessageAction,
-    PostbackAction,
-    StickerSendMessage,
-    TemplateSendMessage,
-    TextSendMessage,
-    URIAction,
-)
+from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_ACCESS_TOKEN
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CONF_ACCESS_TOKEN,
+    EVENT_HOMEASSISTANT_FINAL_WRITE,
+    Platform,
+)
+from homeassistant.core import Event, HomeAssistant
 from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
-from .helpers import get_quota
-from .http import async_register_http
+from .cache import TTLCache
+from .client import TokenBucket
+from .const import (
+    CONF_CHANNEL_SECRET,
+    CONF_COALESCE_WINDOW,
+    CONF_CONTENT_CACHE_SIZE,
+    CONF_DEFER_LOW_PRIORITY,
+    CONF_FETCH_CONTENT,
+    CONF_FETCH_PROFILES,
+    CONF_MAX_RETRIES,
+    CONF_NEW_MESSAGES,
+    CONF_OUTBOX_TTL,
+    CONF_OVERFLOW_POLICY,
+    CONF_PAYLOAD_PROFILE,
+    CONF_PREFER_REPLY,
+    CONF_QUEUE_SIZE,
+    CONF_QUOTA_SCAN_INTERVAL,
+    CONF_QUOTA_THRESHOLD,
+    CONF_RATE_LIMIT,
+    CONF_WORKERS,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_CONTENT_CACHE_SIZE,
+    DEFAULT_DEFER_LOW_PRIORITY,
+    DEFAULT_FETCH_CONTENT,
+    DEFAULT_FETCH_PROFILES,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_OUTBOX_TTL,
+    DEFAULT_OVERFLOW_POLICY,
+    DEFAULT_PAYLOAD_PROFILE,
+    DEFAULT_PREFER_REPLY,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_QUOTA_SCAN_INTERVAL,
+    DEFAULT_QUOTA_THRESHOLD,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_WORKERS,
+    DOMAIN,
+    NEW_MESSAGES_SIZE,
+    NEW_MESSAGES_TTL,
+    REPLY_TOKEN_TTL,
+    REPLY_TOKENS_SIZE,
+    SEEN_EVENTS_SIZE,
+    SEEN_EVENTS_TTL,
+)
+from .content import ContentStore
+from .coordinator import QuotaCoordinator
+from .dispatcher import EventDispatcher
+from .helpers import build_chat_index, create_client
+from .http import async_handle_event, async_register_http
+from .media import MediaStore
+from .metrics import Metrics
+from .outbound import OutboundQueue
+from .outbox import Outbox
+from .profiles import ProfileCache
 from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
-MESSAGES = {
-    "text": TextSendMessage,
-    "image": ImageSendMessage,
-    "sticker": StickerSendMessage,
-    "template": TemplateSendMessage,
-    "location": LocationSendMessage,
-    "flex": FlexSendMessage,
-    "audio": AudioSendMessage,
-}
+PLATFORMS = [Platform.SENSOR]
 
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up OpenAI Conversation."""
+    media = hass.data.setdefault(DOMAIN, {})["media"] = MediaStore(
+        hass, hass.config.path(DOMAIN, "media")
+    )
+    media.async_start()
+    async_register_http(hass)
     await async_setup_services(hass, config)
     return True
 
@@ -49,16 +88,150 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up OpenAI Conversation from a config entry."""
 
-    await get_quota(hass, entry.data[CONF_ACCESS_TOKEN])
-    hass.data.setdefault(DOMAIN, {}).setdefault("entry", {}).setdefault(
-        entry.entry_id, {}
+    metrics = Metrics()
+    client = create_client(hass, entry.data[CONF_ACCESS_TOKEN], metrics)
+    coordinator = QuotaCoordinator(hass, client, get_quota_scan_interval(entry))
+    client.quota = coordinator
+    outbox = Outbox(
+        hass, entry.entry_id, entry.options.get(CONF_OUTBOX_TTL, DEFAULT_OUTBOX_TTL)
+    )
+    records = await outbox.async_load()
+    content = ContentStore(
+        hass,
+        client,
+        hass.config.path(DOMAIN, "content", entry.entry_id),
+        get_content_cache_size(entry),
+    )
+    await content.async_load()
+    profiles = ProfileCache(hass, client, entry.entry_id)
+    await profiles.async_load()
+    # only registered once complete, so the webhook and services never see a
+    # channel without its client or chats
+    data: dict[str, Any] = {}
+    data["entry_id"] = entry.entry_id
+    data["client"] = client
+    data["metrics"] = metrics
+    data["content"] = content
+    data["profiles"] = profiles
+    data["queue"] = OutboundQueue(hass, client, get_coalesce_window(entry), outbox)
+    data["coordinator"] = coordinator
+    coordinator.queue = data["queue"]
+    data["dispatcher"] = EventDispatcher(
+        hass,
+        partial(async_handle_event, hass, entry.entry_id),
+        DEFAULT_WORKERS,
+        DEFAULT_QUEUE_SIZE,
+        DEFAULT_OVERFLOW_POLICY,
+        metrics,
+    )
+    data["seen_events"] = TTLCache(SEEN_EVENTS_SIZE, SEEN_EVENTS_TTL)
+    data[CONF_NEW_MESSAGES] = TTLCache(NEW_MESSAGES_SIZE, NEW_MESSAGES_TTL)
+    data["reply_tokens"] = TTLCache(REPLY_TOKENS_SIZE, REPLY_TOKEN_TTL)
+    data["enriching"] = {}
+    apply_options(entry, data)
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+
+    async def async_flush_outbox(event: Event) -> None:
+        await outbox.async_flush()
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_FINAL_WRITE, async_flush_outbox)
+    )
+    for record in records:
+        if record.get("deferred"):
+            coordinator.async_defer(record["to"], record["messages"], record["id"])
+    if records := [record for record in records if not record.get("deferred")]:
+        entry.async_create_background_task(
+            hass, data["queue"].async_replay(records), "line_bot outbox replay"
+        )
+    entry.async_create_background_task(
+        hass, coordinator.async_validate(), "line_bot validate credentials"
     )
 
-    async_register_http(hass)
+    channels = hass.data.setdefault(DOMAIN, {}).setdefault("entry", {})
+    channels[entry.entry_id] = data
+    try:
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    except Exception:
+        channels.pop(entry.entry_id, None)
+        await data["dispatcher"].async_stop()
+        await data["queue"].async_shutdown()
+        raise
     return True
 
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply updated data and options to the running entry."""
+    apply_options(entry, hass.data[DOMAIN]["entry"][entry.entry_id])
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload OpenAI."""
-    hass.data[DOMAIN]["entry"].pop(entry.entry_id)
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+    data = hass.data[DOMAIN]["entry"].pop(entry.entry_id)
+    await data["dispatcher"].async_stop()
+    await data["queue"].async_shutdown()
+    await data["profiles"].async_save()
     return True
+
+
+def apply_options(entry: ConfigEntry, data: dict) -> None:
+    """Apply the options of the entry to its client and queue."""
+    data[CONF_CHANNEL_SECRET] = entry.data[CONF_CHANNEL_SECRET].encode("utf-8")
+    data["chat_ids"], data["chat_names"] = build_chat_index(entry)
+    data[CONF_PAYLOAD_PROFILE] = entry.options.get(
+        CONF_PAYLOAD_PROFILE, DEFAULT_PAYLOAD_PROFILE
+    )
+    data[CONF_FETCH_CONTENT] = entry.options.get(
+        CONF_FETCH_CONTENT, DEFAULT_FETCH_CONTENT
+    )
+    data[CONF_PREFER_REPLY] = entry.options.get(CONF_PREFER_REPLY, DEFAULT_PREFER_REPLY)
+    data[CONF_FETCH_PROFILES] = entry.options.get(
+        CONF_FETCH_PROFILES, DEFAULT_FETCH_PROFILES
+    )
+    data["content"].max_size = get_content_cache_size(entry)
+    coordinator = data["coordinator"]
+    coordinator.update_interval = get_quota_scan_interval(entry)
+    coordinator.threshold = entry.options.get(
+        CONF_QUOTA_THRESHOLD, DEFAULT_QUOTA_THRESHOLD
+    )
+    coordinator.defer_low_priority = entry.options.get(
+        CONF_DEFER_LOW_PRIORITY, DEFAULT_DEFER_LOW_PRIORITY
+    )
+    client = data["client"]
+    rate_limit = entry.options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT)
+    if client.rate_limiter.rate != rate_limit:
+        client.rate_limiter = TokenBucket(rate_limit)
+    client.max_retries = entry.options.get(CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES)
+    data["queue"].window = get_coalesce_window(entry)
+    data["queue"].outbox.ttl = entry.options.get(CONF_OUTBOX_TTL, DEFAULT_OUTBOX_TTL)
+
+    dispatcher = data["dispatcher"]
+    dispatcher.workers = entry.options.get(CONF_WORKERS, DEFAULT_WORKERS)
+    dispatcher.queue_size = entry.options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE)
+    dispatcher.overflow_policy = entry.options.get(
+        CONF_OVERFLOW_POLICY, DEFAULT_OVERFLOW_POLICY
+    )
+    dispatcher.async_start()
+
+
+def get_coalesce_window(entry: ConfigEntry) -> float:
+    """Get the coalesce window in seconds."""
+    return entry.options.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW) / 1000
+
+
+def get_content_cache_size(entry: ConfigEntry) -> int:
+    """Get the content cache size in bytes."""
+    return (
+        entry.options.get(CONF_CONTENT_CACHE_SIZE, DEFAULT_CONTENT_CACHE_SIZE)
+        * 1024
+        * 1024
+    )
+
+
+def get_quota_scan_interval(entry: ConfigEntry) -> timedelta:
+    """Get the interval between message quota polls."""
+    return timedelta(
+        minutes=entry.options.get(CONF_QUOTA_SCAN_INTERVAL, DEFAULT_QUOTA_SCAN_INTERVAL)
+    )
@@ -0,0 +1,79 @@
+"""Bounded caches for Line Bot integration."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator
+import time
+from typing import Any, Generic, TypeVar
+
+_KT = TypeVar("_KT", bound=Hashable)
+_VT = TypeVar("_VT")
+
+
+class TTLCache(Generic[_KT, _VT]):
+    """LRU cache of at most `maxsize` entries expiring after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[_KT, tuple[float, _VT]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of entries, including expired ones not evicted yet."""
+        return len(self._data)
+
+    def __contains__(self, key: _KT) -> bool:
+        """Check if a key is cached and not expired, without counting it."""
+        item = self._data.get(key)
+        return item is not None and item[0] > time.monotonic()
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Return hit and miss statistics."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+    def get(self, key: _KT, default: _VT | None = None) -> _VT | None:
+        """Get a value, marking it as recently used."""
+        item = self._data.get(key)
+        if item is None or item[0] <= time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: _KT, value: _VT, ttl: float | None = None) -> None:
+        """Set a value, evicting the least recently used entries when full."""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: _KT, default: _VT | None = None) -> _VT | None:
+        """Remove a value and return it if it was not expired."""
+        item = self._data.pop(key, None)
+        if item is None or item[0] <= time.monotonic():
+            return default
+        return item[1]
+
+    def items(self) -> Iterator[tuple[_KT, _VT]]:
+        """Iterate over entries that are not expired."""
+        now = time.monotonic()
+        return ((key, item[1]) for key, item in self._data.items() if item[0] > now)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._data.clear()
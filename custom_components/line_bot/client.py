@@ -0,0 +1,365 @@
+"""Async client for the Line Messaging API."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import json
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout
+
+from .const import DEFAULT_MAX_RETRIES, DEFAULT_RATE_LIMIT
+from .exceptions import LineApiError
+from .metrics import STATUS_ERROR, Metrics
+
+if TYPE_CHECKING:
+    from .coordinator import QuotaCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+API_ENDPOINT = "https://api.line.me"
+API_DATA_ENDPOINT = "https://api-data.line.me"
+DEFAULT_TIMEOUT = 10
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+
+
+def to_json_dicts(messages) -> list[dict[str, Any]]:
+    """Convert a message or a list of messages to json dicts."""
+    if not isinstance(messages, (list, tuple)):
+        messages = [messages]
+    return [
+        message.as_json_dict() if hasattr(message, "as_json_dict") else message
+        for message in messages
+    ]
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second on average."""
+
+    def __init__(self, rate: float) -> None:
+        """Initialize the bucket."""
+        self.rate = rate
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.rate, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def get_retry_delay(
+    attempt: int, headers: dict[str, str] | None = None
+) -> float | None:
+    """Get the delay before retrying, honoring Retry-After when given.
+
+    Returns None when Retry-After asks to wait longer than RETRY_MAX_DELAY,
+    so the caller gives up instead of holding the request that long.
+    """
+    try:
+        delay = max(float((headers or {})["Retry-After"]), 0)
+    except (KeyError, ValueError):
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+    return delay if delay <= RETRY_MAX_DELAY else None
+
+
+def to_api_error(response: ClientResponse, text: str) -> LineApiError:
+    """Build the error of a failed request from its response."""
+    try:
+        result = json.loads(text) if text else {}
+    except ValueError:
+        result = {"message": text}
+    return LineApiError(
+        response.status,
+        result.get("message") or response.reason or "",
+        result.get("details"),
+        dict(response.headers),
+    )
+
+
+def is_retryable(err: LineApiError) -> bool:
+    """Check if a failed request may succeed when retried."""
+    return err.status_code == 429 or err.status_code >= 500
+
+
+class LineBotClient:
+    """Line Messaging API client on top of a shared aiohttp session.
+
+    One client lives as long as its config entry, so every request reuses the
+    pooled keep-alive connections of the session instead of paying for a new
+    TLS handshake and an executor thread.
+    """
+
+    def __init__(
+        self,
+        session: ClientSession,
+        access_token: str,
+        endpoint: str = API_ENDPOINT,
+        data_endpoint: str = API_DATA_ENDPOINT,
+        timeout: float = DEFAULT_TIMEOUT,
+        metrics: Metrics | None = None,
+    ) -> None:
+        """Initialize the client."""
+        self.session = session
+        self.endpoint = endpoint
+        self.data_endpoint = data_endpoint
+        self.timeout = ClientTimeout(total=timeout)
+        self.headers = {"Authorization": f"Bearer {access_token}"}
+        self.rate_limiter = TokenBucket(DEFAULT_RATE_LIMIT)
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self.metrics = metrics
+        self.quota: QuotaCoordinator | None = None
+
+    async def reply_message(
+        self, reply_token: str, messages, notification_disabled: bool = False
+    ) -> dict[str, Any]:
+        """Reply to an event with up to 5 messages."""
+        return await self._post(
+            "/v2/bot/message/reply",
+            {
+                "replyToken": reply_token,
+                "messages": to_json_dicts(messages),
+                "notificationDisabled": notification_disabled,
+            },
+        )
+
+    async def push_message(
+        self, to: str, messages, notification_disabled: bool = False
+    ) -> dict[str, Any]:
+        """Push up to 5 messages to a user, group or room."""
+        return await self._send(
+            "/v2/bot/message/push",
+            {
+                "to": to,
+                "messages": to_json_dicts(messages),
+                "notificationDisabled": notification_disabled,
+            },
+        )
+
+    async def multicast(
+        self, to: list[str], messages, notification_disabled: bool = False
+    ) -> dict[str, Any]:
+        """Send messages to up to 500 users at once."""
+        return await self._send(
+            "/v2/bot/message/multicast",
+            {
+                "to": to,
+                "messages": to_json_dicts(messages),
+                "notificationDisabled": notification_disabled,
+            },
+        )
+
+    async def broadcast(
+        self, messages, notification_disabled: bool = False
+    ) -> dict[str, Any]:
+        """Send messages to every user who added the bot as a friend."""
+        return await self._send(
+            "/v2/bot/message/broadcast",
+            {
+                "messages": to_json_dicts(messages),
+                "notificationDisabled": notification_disabled,
+            },
+        )
+
+    async def narrowcast(
+        self,
+        messages,
+        recipient: dict[str, Any] | None = None,
+        filter: dict[str, Any] | None = None,  # pylint: disable=redefined-builtin
+        limit: dict[str, Any] | None = None,
+        notification_disabled: bool = False,
+    ) -> dict[str, Any]:
+        """Send messages to users matching a recipient and demographic filter."""
+        data = {
+            "messages": to_json_dicts(messages),
+            "notificationDisabled": notification_disabled,
+        }
+        if recipient is not None:
+            data["recipient"] = recipient
+        if filter is not None:
+            data["filter"] = filter
+        if limit is not None:
+            data["limit"] = limit
+        return await self._send("/v2/bot/message/narrowcast", data)
+
+    async def leave_group(self, group_id: str) -> dict[str, Any]:
+        """Leave a group."""
+        return await self._post(f"/v2/bot/group/{group_id}/leave")
+
+    async def leave_room(self, room_id: str) -> dict[str, Any]:
+        """Leave a room."""
+        return await self._post(f"/v2/bot/room/{room_id}/leave")
+
+    async def get_bot_info(self) -> dict[str, Any]:
+        """Get the user ID, basic ID and display name of the bot."""
+        return await self._get("/v2/bot/info")
+
+    async def get_profile(self, user_id: str) -> dict[str, Any]:
+        """Get the profile of a user who added the bot as a friend."""
+        return await self._get(f"/v2/bot/profile/{user_id}")
+
+    async def get_group_member_profile(
+        self, group_id: str, user_id: str
+    ) -> dict[str, Any]:
+        """Get the profile of a member of a group."""
+        return await self._get(f"/v2/bot/group/{group_id}/member/{user_id}")
+
+    async def get_room_member_profile(
+        self, room_id: str, user_id: str
+    ) -> dict[str, Any]:
+        """Get the profile of a member of a room."""
+        return await self._get(f"/v2/bot/room/{room_id}/member/{user_id}")
+
+    async def get_group_summary(self, group_id: str) -> dict[str, Any]:
+        """Get the name and picture of a group."""
+        return await self._get(f"/v2/bot/group/{group_id}/summary")
+
+    async def get_message_quota(self) -> dict[str, Any]:
+        """Get the monthly message quota."""
+        return await self._get("/v2/bot/message/quota")
+
+    async def get_message_quota_consumption(self) -> dict[str, Any]:
+        """Get the number of messages sent in the current month."""
+        return await self._get("/v2/bot/message/quota/consumption")
+
+    @asynccontextmanager
+    async def get_message_content(
+        self, message_id: str
+    ) -> AsyncIterator[ClientResponse]:
+        """Open the content of an image, video, audio or file message.
+
+        The response body is left unread so it can be streamed. Only reads are
+        bounded by the timeout, since large videos take a while to download.
+        """
+        path = f"/v2/bot/message/{message_id}/content"
+        start = time.monotonic()
+        try:
+            response = await self.session.get(
+                self.data_endpoint + path,
+                headers=self.headers,
+                timeout=ClientTimeout(sock_read=self.timeout.total),
+            )
+        except (ClientError, TimeoutError):
+            self._record(path, STATUS_ERROR, start)
+            raise
+        async with response:
+            self._record(path, response.status, start)
+            if not 200 <= response.status < 300:
+                raise to_api_error(response, await response.text())
+            yield response
+
+    async def _get(self, path: str, endpoint: str | None = None) -> dict[str, Any]:
+        return await self._request("GET", path, endpoint=endpoint)
+
+    async def _post(
+        self,
+        path: str,
+        data: dict[str, Any] | None = None,
+        endpoint: str | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> dict[str, Any]:
+        return await self._request(
+            "POST", path, data=data, endpoint=endpoint, headers=headers
+        )
+
+    async def _send(self, path: str, data: dict[str, Any]) -> dict[str, Any]:
+        """Send a rate limited message request, retrying on 429 and 5xx.
+
+        Every attempt carries the same X-Line-Retry-Key, so Line accepts a
+        retried request at most once.
+        """
+        headers = {"X-Line-Retry-Key": str(uuid4())}
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                result = await self._post(path, data, headers=headers)
+            except LineApiError as err:
+                if err.status_code == 409 and err.accepted_request_id:
+                    result = {"request_id": err.accepted_request_id}
+                    break
+                if attempt >= self.max_retries or not is_retryable(err):
+                    raise
+                if (delay := get_retry_delay(attempt, err.headers)) is None:
+                    raise
+                error = err
+            except (ClientError, TimeoutError) as err:
+                if attempt >= self.max_retries:
+                    raise
+                error, delay = err, get_retry_delay(attempt)
+            else:
+                break
+            attempt += 1
+            _LOGGER.warning(
+                "Retrying %s in %.1f seconds (%s/%s): %s",
+                path,
+                delay,
+                attempt,
+                self.max_retries,
+                error,
+            )
+            await asyncio.sleep(delay)
+
+        if self.quota is not None:
+            self.quota.async_count(path, data)
+        return result
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        data: dict[str, Any] | None = None,
+        endpoint: str | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> dict[str, Any]:
+        headers = {**self.headers, **(headers or {})}
+        body = None
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(data)
+
+        start = time.monotonic()
+        status = STATUS_ERROR
+        try:
+            async with self.session.request(
+                method,
+                (endpoint or self.endpoint) + path,
+                headers=headers,
+                data=body,
+                timeout=self.timeout,
+            ) as response:
+                status = response.status
+                text = await response.text()
+        finally:
+            self._record(path, status, start)
+
+        if not 200 <= response.status < 300:
+            raise to_api_error(response, text)
+        try:
+            result = json.loads(text) if text else {}
+        except ValueError:
+            result = {"message": text}
+        if request_id := response.headers.get("X-Line-Request-Id"):
+            result["request_id"] = request_id
+        return result
+
+    def _record(self, path: str, status: int | str, start: float) -> None:
+        if self.metrics is not None:
+            self.metrics.record_request(path, status, time.monotonic() - start)
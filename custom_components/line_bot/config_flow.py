@@ -2,10 +2,11 @@
 
 from __future__ import annotations
 
+from collections.abc import Mapping
 import logging
 from typing import Any
 
-from linebot.exceptions import LineBotApiError
+from aiohttp import ClientError
 import voluptuous as vol
 
 from homeassistant import config_entries
@@ -22,19 +23,57 @@ from homeassistant.helpers.selector import (
 from .const import (
     CONF_ACTION_ADD_CHAT,
     CONF_ACTION_REMOVE_CHAT,
+    CONF_ACTION_SETTINGS,
     CONF_ALLOWED_CHAT_IDS,
     CONF_CHANNEL_SECRET,
     CONF_CHAT_ID,
+    CONF_COALESCE_WINDOW,
+    CONF_CONTENT_CACHE_SIZE,
+    CONF_DEFER_LOW_PRIORITY,
+    CONF_FETCH_CONTENT,
+    CONF_FETCH_PROFILES,
+    CONF_MAX_RETRIES,
     CONF_NEW_MESSAGES,
+    CONF_OUTBOX_TTL,
+    CONF_OVERFLOW_POLICY,
+    CONF_PAYLOAD_PROFILE,
+    CONF_PREFER_REPLY,
+    CONF_QUEUE_SIZE,
+    CONF_QUOTA_SCAN_INTERVAL,
+    CONF_QUOTA_THRESHOLD,
+    CONF_RATE_LIMIT,
+    CONF_WORKERS,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_CONTENT_CACHE_SIZE,
+    DEFAULT_DEFER_LOW_PRIORITY,
+    DEFAULT_FETCH_CONTENT,
+    DEFAULT_FETCH_PROFILES,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_OUTBOX_TTL,
+    DEFAULT_OVERFLOW_POLICY,
+    DEFAULT_PAYLOAD_PROFILE,
+    DEFAULT_PREFER_REPLY,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_QUOTA_SCAN_INTERVAL,
+    DEFAULT_QUOTA_THRESHOLD,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_WORKERS,
     DOMAIN,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    PAYLOAD_PROFILE_FULL,
+    PAYLOAD_PROFILE_MINIMAL,
+    PAYLOAD_PROFILE_STANDARD,
 )
-from .helpers import get_quota
+from .exceptions import LineApiError
+from .helpers import create_client
 
 _LOGGER = logging.getLogger(__name__)
 
 CONF_ACTIONS = {
     CONF_ACTION_ADD_CHAT: "Add a chat",
     CONF_ACTION_REMOVE_CHAT: "Remove a chat",
+    CONF_ACTION_SETTINGS: "Settings",
 }
 
 STEP_USER_DATA_SCHEMA = vol.Schema(
@@ -45,13 +84,14 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
 )
 
 
-async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> None:
+async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any]:
     """Validate the user input allows us to connect.
 
     Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
+    Returns the info of the bot.
     """
     access_token = data[CONF_ACCESS_TOKEN]
-    await get_quota(hass, access_token)
+    return await create_client(hass, access_token).get_bot_info()
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -70,19 +110,59 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         errors = {}
         try:
-            await validate_input(self.hass, user_input)
-        except LineBotApiError:
+            info = await validate_input(self.hass, user_input)
+        except LineApiError:
             errors["base"] = "invalid_auth"
+        except (ClientError, TimeoutError):
+            errors["base"] = "cannot_connect"
         except Exception:  # pylint: disable=broad-except
             _LOGGER.exception("Unexpected exception")
             errors["base"] = "unknown"
         else:
-            return self.async_create_entry(title="Line Bot", data=user_input)
+            await self.async_set_unique_id(info["userId"])
+            self._abort_if_unique_id_configured()
+            return self.async_create_entry(
+                title=info.get("displayName", "Line Bot"), data=user_input
+            )
 
         return self.async_show_form(
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
 
+    async def async_step_reauth(self, entry_data: Mapping[str, Any]) -> FlowResult:
+        """Handle an access token rejected by Line."""
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Ask for new credentials of the channel."""
+        errors = {}
+        if user_input is not None:
+            entry = self.hass.config_entries.async_get_entry(self.context["entry_id"])
+            try:
+                info = await validate_input(self.hass, user_input)
+            except LineApiError:
+                errors["base"] = "invalid_auth"
+            except (ClientError, TimeoutError):
+                errors["base"] = "cannot_connect"
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Unexpected exception")
+                errors["base"] = "unknown"
+            else:
+                if entry.unique_id not in (None, info["userId"]):
+                    errors["base"] = "wrong_channel"
+                else:
+                    self.hass.config_entries.async_update_entry(
+                        entry, data={**entry.data, **user_input}
+                    )
+                    await self.hass.config_entries.async_reload(entry.entry_id)
+                    return self.async_abort(reason="reauth_successful")
+
+        return self.async_show_form(
+            step_id="reauth_confirm", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
+        )
+
     @staticmethod
     def async_get_options_flow(
         config_entry: config_entries.ConfigEntry,
@@ -108,6 +188,8 @@ class LineBotOptionsFlow(config_entries.OptionsFlow):
                 return await self.async_step_add_chat()
             if user_input.get(CONF_ACTION) == "remove_chat":
                 return await self.async_step_remove_chat()
+            if user_input.get(CONF_ACTION) == CONF_ACTION_SETTINGS:
+                return await self.async_step_settings()
 
         return self.async_show_form(
             step_id="init",
@@ -136,7 +218,7 @@ class LineBotOptionsFlow(config_entries.OptionsFlow):
                             options=[
                                 SelectOptionDict(
                                     value=key,
-                                    label=f"{key[:5]} ({value.message.text})",
+                                    label=f"{key[:5]} ({value.preview})",
                                 )
                                 for key, value in new_messages.items()
                             ],
@@ -164,7 +246,7 @@ class LineBotOptionsFlow(config_entries.OptionsFlow):
                 self.config_entry,
                 data=new_data,
             )
-            return self.async_create_entry(title="", data={})
+            return self.async_create_entry(title="", data=self.config_entry.options)
 
         return self.async_show_form(
             step_id="configure_chat",
@@ -189,7 +271,7 @@ class LineBotOptionsFlow(config_entries.OptionsFlow):
                 self.config_entry,
                 data=new_data,
             )
-            return self.async_create_entry(title="", data={})
+            return self.async_create_entry(title="", data=self.config_entry.options)
 
         allowed_chat_ids = list(
             self.config_entry.data.get(CONF_ALLOWED_CHAT_IDS, {}).keys()
@@ -209,8 +291,116 @@ class LineBotOptionsFlow(config_entries.OptionsFlow):
             ),
         )
 
+    async def async_step_settings(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Change the settings."""
+        if user_input is not None:
+            return self.async_create_entry(
+                title="", data={**self.config_entry.options, **user_input}
+            )
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="settings",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_COALESCE_WINDOW,
+                        default=options.get(
+                            CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
+                    vol.Required(
+                        CONF_RATE_LIMIT,
+                        default=options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=2000)),
+                    vol.Required(
+                        CONF_MAX_RETRIES,
+                        default=options.get(CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=10)),
+                    vol.Required(
+                        CONF_OUTBOX_TTL,
+                        default=options.get(CONF_OUTBOX_TTL, DEFAULT_OUTBOX_TTL),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                    vol.Required(
+                        CONF_WORKERS,
+                        default=options.get(CONF_WORKERS, DEFAULT_WORKERS),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=32)),
+                    vol.Required(
+                        CONF_QUEUE_SIZE,
+                        default=options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_OVERFLOW_POLICY,
+                        default=options.get(
+                            CONF_OVERFLOW_POLICY, DEFAULT_OVERFLOW_POLICY
+                        ),
+                    ): SelectSelector(
+                        SelectSelectorConfig(
+                            options=[OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST],
+                            translation_key=CONF_OVERFLOW_POLICY,
+                        )
+                    ),
+                    vol.Required(
+                        CONF_PAYLOAD_PROFILE,
+                        default=options.get(
+                            CONF_PAYLOAD_PROFILE, DEFAULT_PAYLOAD_PROFILE
+                        ),
+                    ): SelectSelector(
+                        SelectSelectorConfig(
+                            options=[
+                                PAYLOAD_PROFILE_MINIMAL,
+                                PAYLOAD_PROFILE_STANDARD,
+                                PAYLOAD_PROFILE_FULL,
+                            ],
+                            translation_key=CONF_PAYLOAD_PROFILE,
+                        )
+                    ),
+                    vol.Required(
+                        CONF_FETCH_CONTENT,
+                        default=options.get(CONF_FETCH_CONTENT, DEFAULT_FETCH_CONTENT),
+                    ): bool,
+                    vol.Required(
+                        CONF_CONTENT_CACHE_SIZE,
+                        default=options.get(
+                            CONF_CONTENT_CACHE_SIZE, DEFAULT_CONTENT_CACHE_SIZE
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_FETCH_PROFILES,
+                        default=options.get(
+                            CONF_FETCH_PROFILES, DEFAULT_FETCH_PROFILES
+                        ),
+                    ): bool,
+                    vol.Required(
+                        CONF_QUOTA_SCAN_INTERVAL,
+                        default=options.get(
+                            CONF_QUOTA_SCAN_INTERVAL, DEFAULT_QUOTA_SCAN_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1440)),
+                    vol.Required(
+                        CONF_QUOTA_THRESHOLD,
+                        default=options.get(
+                            CONF_QUOTA_THRESHOLD, DEFAULT_QUOTA_THRESHOLD
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=100)),
+                    vol.Required(
+                        CONF_DEFER_LOW_PRIORITY,
+                        default=options.get(
+                            CONF_DEFER_LOW_PRIORITY, DEFAULT_DEFER_LOW_PRIORITY
+                        ),
+                    ): bool,
+                    vol.Required(
+                        CONF_PREFER_REPLY,
+                        default=options.get(CONF_PREFER_REPLY, DEFAULT_PREFER_REPLY),
+                    ): bool,
+                }
+            ),
+        )
+
     def get_new_messages(self):
         """Get new messages."""
-        return next(iter(self.hass.data[DOMAIN]["entry"].values())).get(
-            CONF_NEW_MESSAGES, {}
-        )
+        return self.hass.data[DOMAIN]["entry"][self.config_entry.entry_id][
+            CONF_NEW_MESSAGES
+        ]
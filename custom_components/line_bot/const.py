@@ -4,10 +4,116 @@ DOMAIN = "line_bot"
 
 CONF_ACTION_ADD_CHAT = "add_chat"
 CONF_ACTION_REMOVE_CHAT = "remove_chat"
+CONF_ACTION_SETTINGS = "settings"
 CONF_ALLOWED_CHAT_IDS = "allowed_chat_ids"
 CONF_CHANNEL_SECRET = "channel_secret"
 CONF_CHAT_ID = "chat_id"
+CONF_COALESCE_WINDOW = "coalesce_window"
+CONF_CONTENT_CACHE_SIZE = "content_cache_size"
+CONF_DEFER_LOW_PRIORITY = "defer_low_priority"
+CONF_FETCH_CONTENT = "fetch_content"
+CONF_FETCH_PROFILES = "fetch_profiles"
+CONF_MAX_RETRIES = "max_retries"
 CONF_NEW_MESSAGES = "new_messages"
+CONF_OUTBOX_TTL = "outbox_ttl"
+CONF_OVERFLOW_POLICY = "overflow_policy"
+CONF_PAYLOAD_PROFILE = "payload_profile"
+CONF_PREFER_REPLY = "prefer_reply"
+CONF_QUEUE_SIZE = "queue_size"
+CONF_QUOTA_SCAN_INTERVAL = "quota_scan_interval"
+CONF_QUOTA_THRESHOLD = "quota_threshold"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_WORKERS = "workers"
+
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+
+SPREAD_FIRST = "first"
+SPREAD_MOST_REMAINING = "most_remaining"
+SPREAD_ROUND_ROBIN = "round_robin"
+
+PRIORITY_LOW = "low"
+PRIORITY_NORMAL = "normal"
+
+PAYLOAD_PROFILE_FULL = "full"
+PAYLOAD_PROFILE_MINIMAL = "minimal"
+PAYLOAD_PROFILE_STANDARD = "standard"
+
+DEFAULT_COALESCE_WINDOW = 200
+DEFAULT_CONTENT_CACHE_SIZE = 200
+DEFAULT_DEFER_LOW_PRIORITY = False
+DEFAULT_FETCH_CONTENT = False
+DEFAULT_FETCH_PROFILES = False
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_OUTBOX_TTL = 3600
+DEFAULT_OVERFLOW_POLICY = OVERFLOW_DROP_OLDEST
+DEFAULT_PAYLOAD_PROFILE = PAYLOAD_PROFILE_FULL
+DEFAULT_PREFER_REPLY = False
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_QUOTA_SCAN_INTERVAL = 60
+DEFAULT_QUOTA_THRESHOLD = 90
+DEFAULT_RATE_LIMIT = 100
+DEFAULT_WORKERS = 4
 
 EVENT_WEBHOOK_TEXT_RECEIVED = "line_webhook_text_received"
 EVENT_WEBHOOK_POSTBACK_RECEIVED = "line_webhook_postback_received"
+EVENT_WEBHOOK_IMAGE_RECEIVED = "line_webhook_image_received"
+EVENT_WEBHOOK_VIDEO_RECEIVED = "line_webhook_video_received"
+EVENT_WEBHOOK_AUDIO_RECEIVED = "line_webhook_audio_received"
+EVENT_WEBHOOK_FILE_RECEIVED = "line_webhook_file_received"
+EVENT_WEBHOOK_LOCATION_RECEIVED = "line_webhook_location_received"
+EVENT_WEBHOOK_STICKER_RECEIVED = "line_webhook_sticker_received"
+EVENT_WEBHOOK_FOLLOW_RECEIVED = "line_webhook_follow_received"
+EVENT_WEBHOOK_UNFOLLOW_RECEIVED = "line_webhook_unfollow_received"
+EVENT_WEBHOOK_JOIN_RECEIVED = "line_webhook_join_received"
+EVENT_WEBHOOK_LEAVE_RECEIVED = "line_webhook_leave_received"
+EVENT_WEBHOOK_MEMBER_JOINED_RECEIVED = "line_webhook_member_joined_received"
+EVENT_WEBHOOK_MEMBER_LEFT_RECEIVED = "line_webhook_member_left_received"
+EVENT_WEBHOOK_BEACON_RECEIVED = "line_webhook_beacon_received"
+EVENT_WEBHOOK_ACCOUNT_LINK_RECEIVED = "line_webhook_account_link_received"
+EVENT_WEBHOOK_THINGS_RECEIVED = "line_webhook_things_received"
+EVENT_WEBHOOK_UNSEND_RECEIVED = "line_webhook_unsend_received"
+EVENT_WEBHOOK_VIDEO_PLAY_COMPLETE_RECEIVED = "line_webhook_video_play_complete_received"
+EVENT_WEBHOOK_EVENT_RECEIVED = "line_webhook_event_received"
+
+NEW_MESSAGES_SIZE = 100
+NEW_MESSAGES_TTL = 86400
+NEW_MESSAGE_PREVIEW_LENGTH = 40
+SEEN_EVENTS_SIZE = 10000
+SEEN_EVENTS_TTL = 3600
+REPLY_TOKENS_SIZE = 1000
+# Line only promises reply tokens work for a while after the event was sent
+REPLY_TOKEN_TTL = 50
+PROFILES_SIZE = 5000
+PROFILES_SAVE_DELAY = 60
+PROFILE_TTL = 86400
+PROFILE_MISSING_TTL = 3600
+# Events wait this long for profiles before they are fired without them
+PROFILE_LOOKUP_TIMEOUT = 2
+
+MEDIA_CACHE_SIZE = 1000
+MEDIA_PREVIEW_SIZE = (240, 240)
+# Previews of files no longer in the store are deleted this often
+MEDIA_PRUNE_INTERVAL = 3600
+MEDIA_URL_PATH = "/api/line/media"
+MEDIA_URL_TTL = 86400
+
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+MESSAGE_CACHE_SIZE = 256
+MESSAGE_CACHE_TTL = 86400
+
+FLEX_ALT_TEXT_MAX_LENGTH = 400
+FLEX_BUBBLE_MAX_SIZE = 30000
+FLEX_CAROUSEL_MAX_BUBBLES = 12
+FLEX_CAROUSEL_MAX_SIZE = 50000
+FLEX_TEMPLATE_CACHE_SIZE = 64
+FLEX_TEMPLATE_CACHE_TTL = 86400
+
+DEFERRED_MESSAGES_SIZE = 100
+VALIDATE_RETRY_DELAY = 5
+VALIDATE_RETRY_MAX_DELAY = 80
+
+MAX_MESSAGES_PER_REQUEST = 5
+MULTICAST_CHUNK_SIZE = 500
+WEBHOOK_API_TIMEOUT = 10
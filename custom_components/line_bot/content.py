@@ -0,0 +1,154 @@
+"""Message content cache for Line Bot integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import logging
+import os
+from typing import BinaryIO
+
+from homeassistant.core import HomeAssistant
+
+from .client import LineBotClient
+
+_LOGGER = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+CONTENT_TYPE_EXTENSIONS = {
+    "audio/aac": ".aac",
+    "audio/m4a": ".m4a",
+    "audio/mp4": ".m4a",
+    "audio/mpeg": ".mp3",
+    "audio/x-m4a": ".m4a",
+    "image/gif": ".gif",
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "video/mp4": ".mp4",
+    "video/quicktime": ".mov",
+}
+
+
+class ContentStore:
+    """Cache of message content files, streamed from Line to disk.
+
+    Content is written chunk by chunk as it arrives, so a large video never
+    sits in memory whole. Files are named after the message ID, and the least
+    recently used ones are removed once the total size goes over `max_size`
+    bytes.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, client: LineBotClient, directory: str, max_size: int
+    ) -> None:
+        """Initialize the store."""
+        self.hass = hass
+        self.client = client
+        self.directory = directory
+        self.max_size = max_size
+        self.size = 0
+        self._files: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._downloads: dict[str, asyncio.Task[str]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of cached files."""
+        return len(self._files)
+
+    async def async_load(self) -> None:
+        """Index the files left by the last run, least recently written first."""
+        self._files = await self.hass.async_add_executor_job(_scan, self.directory)
+        self.size = sum(size for _, size in self._files.values())
+
+    async def async_get(self, message_id: str) -> str:
+        """Get the path of the content of a message, downloading it if needed.
+
+        Concurrent calls for the same message share a single download.
+        """
+        if (item := self._files.get(message_id)) is not None:
+            self._files.move_to_end(message_id)
+            return item[0]
+        if (download := self._downloads.get(message_id)) is None:
+            download = self._downloads[message_id] = (
+                self.hass.async_create_background_task(
+                    self._async_download(message_id),
+                    f"line_bot download {message_id}",
+                )
+            )
+            download.add_done_callback(lambda _: self._downloads.pop(message_id, None))
+        return await asyncio.shield(download)
+
+    async def _async_download(self, message_id: str) -> str:
+        async with self.client.get_message_content(message_id) as response:
+            extension = CONTENT_TYPE_EXTENSIONS.get(response.content_type, "")
+            path = os.path.join(self.directory, f"{message_id}{extension}")
+            partial_path = path + PARTIAL_SUFFIX
+            file = await self.hass.async_add_executor_job(
+                _open, self.directory, partial_path
+            )
+            size = 0
+            try:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    await self.hass.async_add_executor_job(file.write, chunk)
+                    size += len(chunk)
+            except BaseException:
+                await self.hass.async_add_executor_job(_discard, file, partial_path)
+                raise
+            await self.hass.async_add_executor_job(_commit, file, partial_path, path)
+
+        _LOGGER.debug("Downloaded %s bytes of message %s", size, message_id)
+        self._files[message_id] = (path, size)
+        self.size += size
+        await self._async_evict()
+        return path
+
+    async def _async_evict(self) -> None:
+        removed = []
+        while self.size > self.max_size and len(self._files) > 1:
+            _, (path, size) = self._files.popitem(last=False)
+            self.size -= size
+            removed.append(path)
+        if removed:
+            await self.hass.async_add_executor_job(_remove, removed)
+
+
+def _scan(directory: str) -> OrderedDict[str, tuple[str, int]]:
+    files = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return OrderedDict()
+    for entry in entries:
+        if entry.name.endswith(PARTIAL_SUFFIX):
+            os.remove(entry.path)
+        elif entry.is_file():
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name.split(".")[0], entry.path, stat))
+    files.sort()
+    return OrderedDict(
+        (message_id, (path, stat.st_size)) for _, message_id, path, stat in files
+    )
+
+
+def _open(directory: str, path: str) -> BinaryIO:
+    os.makedirs(directory, exist_ok=True)
+    return open(path, "wb")  # pylint: disable=consider-using-with
+
+
+def _discard(file: BinaryIO, path: str) -> None:
+    file.close()
+    os.remove(path)
+
+
+def _commit(file: BinaryIO, partial_path: str, path: str) -> None:
+    file.close()
+    os.replace(partial_path, path)
+
+
+def _remove(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,186 @@
+"""Message quota coordinator for Line Bot integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from datetime import timedelta
+import logging
+from typing import Any
+
+from aiohttp import ClientError
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .client import LineBotClient
+from .const import (
+    DEFERRED_MESSAGES_SIZE,
+    DOMAIN,
+    PRIORITY_LOW,
+    VALIDATE_RETRY_DELAY,
+    VALIDATE_RETRY_MAX_DELAY,
+)
+from .exceptions import LineApiError
+from .outbound import OutboundQueue
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class QuotaCoordinator(DataUpdateCoordinator[dict[str, Any]]):
+    """Poll the monthly message quota and its consumption.
+
+    Messages sent between polls are counted locally, so usage stays close
+    to Line's count without extra requests. Once usage reaches `threshold`
+    percent of the quota, low priority messages can be held back until a
+    poll shows room again.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: LineBotClient,
+        update_interval: timedelta,
+    ) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass, _LOGGER, name=f"{DOMAIN} quota", update_interval=update_interval
+        )
+        self.client = client
+        self.queue: OutboundQueue | None = None
+        self.threshold = 100
+        self.defer_low_priority = False
+        self.sent = 0
+        self.deferred: deque[
+            tuple[str | list[str], list[dict[str, Any]], str | None]
+        ] = deque()
+
+    @property
+    def limit(self) -> int | None:
+        """Return the monthly quota, or None if it is unlimited."""
+        if not self.data or self.data["type"] != "limited":
+            return None
+        return self.data["value"]
+
+    @property
+    def usage(self) -> int | None:
+        """Return messages sent this month, including ones sent since the poll."""
+        if not self.data:
+            return None
+        return self.data["total_usage"] + self.sent
+
+    @property
+    def remaining(self) -> int | None:
+        """Return messages left this month."""
+        if self.limit is None or self.usage is None:
+            return None
+        return max(self.limit - self.usage, 0)
+
+    @property
+    def near_limit(self) -> bool:
+        """Check if usage reached the threshold of the quota."""
+        return is_near_limit(self.data, self.sent, self.threshold)
+
+    @callback
+    def async_count(self, path: str, data: dict[str, Any]) -> None:
+        """Count a message request accepted by Line.
+
+        Pushes count as one message and multicasts as one per recipient.
+        Broadcasts and narrowcasts reach an unknown number of friends, so a
+        poll is requested instead.
+        """
+        if path.endswith("/push"):
+            self.sent += 1
+        elif path.endswith("/multicast"):
+            self.sent += len(data["to"])
+        else:
+            self.hass.async_create_task(self.async_request_refresh())
+            return
+        self.async_update_listeners()
+
+    @callback
+    def async_should_defer(self, priority: str | None) -> bool:
+        """Check if a message of a priority should be held back."""
+        return self.defer_low_priority and priority == PRIORITY_LOW and self.near_limit
+
+    @callback
+    def async_defer(
+        self,
+        to: str | list[str],
+        messages: list[dict[str, Any]],
+        record_id: str | None = None,
+    ) -> None:
+        """Hold back messages until there is room in the quota.
+
+        They are kept in the outbox of the queue, so they are still held back
+        after a restart. Messages restored from the outbox pass their record.
+        """
+        outbox = self.queue.outbox if self.queue else None
+        if record_id is None and outbox is not None:
+            record_id = outbox.async_add(to, messages, deferred=True)
+        if len(self.deferred) >= DEFERRED_MESSAGES_SIZE:
+            _LOGGER.warning("Too many deferred messages, dropping the oldest")
+            _, _, dropped_id = self.deferred.popleft()
+            if dropped_id is not None and outbox is not None:
+                outbox.async_ack(dropped_id)
+        self.deferred.append((to, messages, record_id))
+        self.async_update_listeners()
+
+    async def async_validate(self) -> None:
+        """Check the credentials with a first poll, retrying until Line answers.
+
+        Setup doesn't wait for this, so a slow or unreachable Line API can't
+        hold up startup. As with ConfigEntryNotReady, failed polls are retried
+        with a growing delay, and a rejected access token starts
+        reauthentication.
+        """
+        delay = VALIDATE_RETRY_DELAY
+        while True:
+            await self.async_refresh()
+            if self.last_update_success or isinstance(
+                self.last_exception, ConfigEntryAuthFailed
+            ):
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, VALIDATE_RETRY_MAX_DELAY)
+
+    async def _async_update_data(self) -> dict[str, Any]:
+        try:
+            quota = await self.client.get_message_quota()
+            consumption = await self.client.get_message_quota_consumption()
+        except LineApiError as err:
+            if err.status_code == 401:
+                raise ConfigEntryAuthFailed(
+                    f"Access token was rejected: {err}"
+                ) from err
+            raise UpdateFailed(f"Error getting message quota: {err}") from err
+        except (ClientError, TimeoutError) as err:
+            raise UpdateFailed(f"Error getting message quota: {err}") from err
+
+        self.sent = 0
+        data = {
+            "type": quota["type"],
+            "value": quota.get("value"),
+            "total_usage": consumption["totalUsage"],
+        }
+        if self.deferred and self.queue and not is_near_limit(data, 0, self.threshold):
+            self._async_send_deferred()
+        return data
+
+    @callback
+    def _async_send_deferred(self) -> None:
+        _LOGGER.info("Sending %s deferred messages", len(self.deferred))
+        while self.deferred:
+            to, messages, record_id = self.deferred.popleft()
+            self.hass.async_create_background_task(
+                self.queue.async_send(to, messages, record_id),
+                f"line_bot deferred send to {to}",
+            )
+
+
+def is_near_limit(data: dict[str, Any] | None, sent: int, threshold: int) -> bool:
+    """Check if usage, plus messages sent since the poll, reached the threshold."""
+    if not data or data["type"] != "limited":
+        return False
+    return (data["total_usage"] + sent) * 100 >= data["value"] * threshold
@@ -0,0 +1,42 @@
+"""Diagnostics for Line Bot integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_ACCESS_TOKEN
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_CHANNEL_SECRET, CONF_CHAT_ID, CONF_NEW_MESSAGES, DOMAIN
+
+TO_REDACT = {CONF_ACCESS_TOKEN, CONF_CHANNEL_SECRET, CONF_CHAT_ID}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics of a config entry."""
+    data = hass.data[DOMAIN]["entry"][entry.entry_id]
+    domain_data = hass.data[DOMAIN]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "metrics": data["metrics"].as_dict(),
+        "dispatcher": data["dispatcher"].stats,
+        "queue": {"pending": data["queue"].pending},
+        "quota": {
+            "data": data["coordinator"].data,
+            "sent_since_poll": data["coordinator"].sent,
+            "deferred": len(data["coordinator"].deferred),
+        },
+        "content": {"files": len(data["content"]), "size": data["content"].size},
+        "caches": {
+            "seen_events": data["seen_events"].stats,
+            "new_messages": data[CONF_NEW_MESSAGES].stats,
+            "reply_tokens": data["reply_tokens"].stats,
+            "profiles": data["profiles"].stats,
+            "messages": domain_data["message_cache"].stats,
+            "flex_templates": domain_data["flex_templates"].cache.stats,
+        },
+    }
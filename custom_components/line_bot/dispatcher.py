@@ -0,0 +1,110 @@
+"""Webhook event dispatcher for Line Bot integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import OVERFLOW_DROP_OLDEST
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EventDispatcher:
+    """Bounded queue of webhook events drained by a pool of workers.
+
+    The webhook only puts events on the queue, so its response time doesn't
+    depend on how long the handlers take. When the queue is full, either the
+    oldest queued event or the incoming event is dropped.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        handler: Callable[[dict[str, Any]], Awaitable[None]],
+        workers: int,
+        queue_size: int,
+        overflow_policy: str,
+        metrics: Metrics | None = None,
+    ) -> None:
+        """Initialize the dispatcher."""
+        self.hass = hass
+        self.handler = handler
+        self.metrics = metrics
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Return backpressure statistics."""
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "workers": len(self._tasks),
+        }
+
+    @callback
+    def async_put(self, event: dict[str, Any]) -> bool:
+        """Queue an event, returning False if it was dropped."""
+        self.received += 1
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped += 1
+            if self.overflow_policy != OVERFLOW_DROP_OLDEST:
+                _LOGGER.warning("Webhook event queue is full, dropping new event")
+                return False
+            _LOGGER.warning("Webhook event queue is full, dropping oldest event")
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(event)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    @callback
+    def async_start(self) -> None:
+        """Start the workers, or start and stop workers to match `workers`."""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) > self.workers:
+            self._tasks.pop().cancel()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(
+                self.hass.async_create_background_task(
+                    self._worker(), f"line_bot webhook worker {len(self._tasks)}"
+                )
+            )
+
+    async def async_stop(self) -> None:
+        """Stop the workers."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            event = await self.queue.get()
+            start = time.monotonic()
+            try:
+                await self.handler(event)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error handling webhook event")
+            finally:
+                self.processed += 1
+                if self.metrics is not None:
+                    self.metrics.record_handled(time.monotonic() - start)
+                self.queue.task_done()
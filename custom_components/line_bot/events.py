@@ -0,0 +1,102 @@
+"""Webhook events for Line Bot integration."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+from typing import Any
+
+TEST_REPLY_TOKEN = "00000000000000000000000000000000"
+
+
+def validate_signature(channel_secret: bytes, body: bytes, signature: str) -> bool:
+    """Check the X-Line-Signature of a raw request body in constant time."""
+    digest = hmac.new(channel_secret, body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest), signature.encode("utf-8"))
+
+
+class WebhookEvent:
+    """Lightweight view of a raw webhook event.
+
+    Fields are read straight from the parsed JSON, without building a
+    line-bot-sdk event object.
+    """
+
+    __slots__ = ("raw", "entry_id", "profiles")
+
+    def __init__(self, raw: dict[str, Any], entry_id: str) -> None:
+        """Initialize the event of the channel of a config entry."""
+        self.raw = raw
+        self.entry_id = entry_id
+        self.profiles: dict[str, Any] = {}
+
+    @property
+    def type(self) -> str | None:
+        """Return the event type."""
+        return self.raw.get("type")
+
+    @property
+    def reply_token(self) -> str | None:
+        """Return the reply token."""
+        return self.raw.get("replyToken")
+
+    @property
+    def timestamp(self) -> float | None:
+        """Return when Line sent the event, in seconds since the epoch."""
+        timestamp = self.raw.get("timestamp")
+        return timestamp / 1000 if timestamp is not None else None
+
+    @property
+    def source(self) -> dict[str, Any]:
+        """Return the source of the event."""
+        return self.raw.get("source") or {}
+
+    @property
+    def source_type(self) -> str | None:
+        """Return the source type: user, group or room."""
+        return self.source.get("type")
+
+    @property
+    def chat_id(self) -> str | None:
+        """Return the ID of the chat the event came from."""
+        source = self.source
+        source_type = source.get("type")
+        if source_type == "user":
+            return source.get("userId")
+        if source_type == "group":
+            return source.get("groupId")
+        if source_type == "room":
+            return source.get("roomId")
+        return None
+
+    @property
+    def message(self) -> dict[str, Any] | None:
+        """Return the message of a message event."""
+        return self.raw.get("message")
+
+    @property
+    def message_type(self) -> str | None:
+        """Return the message type of a message event."""
+        message = self.raw.get("message")
+        return message.get("type") if message else None
+
+    @property
+    def postback(self) -> dict[str, Any] | None:
+        """Return the postback of a postback event."""
+        return self.raw.get("postback")
+
+    @property
+    def webhook_event_id(self) -> str | None:
+        """Return the unique ID of the event."""
+        return self.raw.get("webhookEventId")
+
+    @property
+    def is_redelivery(self) -> bool:
+        """Check if Line sent the event again."""
+        return bool((self.raw.get("deliveryContext") or {}).get("isRedelivery"))
+
+    @property
+    def is_test(self) -> bool:
+        """Check if the event was sent to verify the webhook URL."""
+        return self.reply_token == TEST_REPLY_TOKEN
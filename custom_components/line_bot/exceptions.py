@@ -18,3 +18,31 @@ class ChatIdNotFound(HomeAssistantError):
     def __str__(self) -> str:
         """Return string representation."""
         return f"chat_id not found for '{self.name}', allowed names are: {list(self.allowed_chat_ids.keys())}"
+
+
+class ChannelNotFound(HomeAssistantError):
+    """When no Line Bot config entry is loaded for a channel."""
+
+
+class LineApiError(HomeAssistantError):
+    """When the Line API answers a request with an error status."""
+
+    def __init__(
+        self,
+        status_code: int,
+        message: str,
+        details: list[dict] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        """Initialize error."""
+        super().__init__(f"Line API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+        self.details = details or []
+        self.headers = headers or {}
+        self.request_id = self.headers.get("X-Line-Request-Id")
+        self.accepted_request_id = self.headers.get("X-Line-Accepted-Request-Id")
+
+
+class MediaError(HomeAssistantError):
+    """When a local file can't be sent as media."""
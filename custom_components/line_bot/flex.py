@@ -0,0 +1,119 @@
+"""Flex message rendering for Line Bot integration."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.template import Template
+
+from .cache import TTLCache
+from .const import (
+    FLEX_ALT_TEXT_MAX_LENGTH,
+    FLEX_BUBBLE_MAX_SIZE,
+    FLEX_CAROUSEL_MAX_BUBBLES,
+    FLEX_CAROUSEL_MAX_SIZE,
+)
+
+CAROUSEL_OVERHEAD = len(b'{"type":"carousel","contents":[]}')
+
+
+class FlexTemplates:
+    """Render Flex message contents from templates.
+
+    Parsed templates are cached by their source, so a template sent over
+    and over is compiled once.
+    """
+
+    def __init__(self, hass: HomeAssistant, cache: TTLCache[str, Template]) -> None:
+        """Initialize the renderer."""
+        self.hass = hass
+        self.cache = cache
+
+    def async_render(
+        self, source: str, variables: dict[str, Any] | None = None
+    ) -> list[dict[str, Any]]:
+        """Render a template to a list of bubbles.
+
+        The template renders a bubble, a carousel or a list of bubbles as
+        JSON.
+        """
+        if (template := self.cache.get(source)) is None:
+            template = Template(source, self.hass)
+            template.ensure_valid()
+            self.cache.set(source, template)
+        rendered = template.async_render(variables, parse_result=False)
+        try:
+            contents = json.loads(rendered)
+        except ValueError as err:
+            raise HomeAssistantError(
+                f"Flex template did not render JSON: {err}"
+            ) from err
+        if isinstance(contents, dict) and contents.get("type") == "carousel":
+            contents = contents.get("contents")
+        elif isinstance(contents, dict):
+            contents = [contents]
+        if not isinstance(contents, list) or not all(
+            isinstance(bubble, dict) for bubble in contents
+        ):
+            raise HomeAssistantError(
+                "Flex template did not render a bubble, a carousel or a list of "
+                "bubbles"
+            )
+        return contents
+
+
+def get_size(contents: dict[str, Any]) -> int:
+    """Get the size in bytes Line counts for Flex contents."""
+    return len(json.dumps(contents, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def to_flex_messages(
+    alt_text: str, bubbles: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """Pack bubbles into as few Flex messages as Line accepts.
+
+    Bubbles are kept in order, and a carousel is closed once it has
+    FLEX_CAROUSEL_MAX_BUBBLES bubbles or the next bubble would take it over
+    FLEX_CAROUSEL_MAX_SIZE bytes.
+    """
+    if not alt_text or len(alt_text) > FLEX_ALT_TEXT_MAX_LENGTH:
+        raise HomeAssistantError(
+            f"Flex alt_text must have 1 to {FLEX_ALT_TEXT_MAX_LENGTH} characters"
+        )
+    carousels: list[list[dict[str, Any]]] = []
+    carousel: list[dict[str, Any]] = []
+    size = CAROUSEL_OVERHEAD
+    for bubble in bubbles:
+        bubble_size = get_size(bubble)
+        if bubble_size > FLEX_BUBBLE_MAX_SIZE:
+            raise HomeAssistantError(
+                f"Flex bubble is {bubble_size} bytes, "
+                f"over the limit of {FLEX_BUBBLE_MAX_SIZE} bytes"
+            )
+        if carousel and (
+            len(carousel) >= FLEX_CAROUSEL_MAX_BUBBLES
+            or size + bubble_size + 1 > FLEX_CAROUSEL_MAX_SIZE
+        ):
+            carousels.append(carousel)
+            carousel = []
+            size = CAROUSEL_OVERHEAD
+        carousel.append(bubble)
+        size += bubble_size + 1
+    if carousel:
+        carousels.append(carousel)
+
+    return [
+        {
+            "type": "flex",
+            "altText": alt_text,
+            "contents": (
+                carousel[0]
+                if len(carousel) == 1
+                else {"type": "carousel", "contents": carousel}
+            ),
+        }
+        for carousel in carousels
+    ]
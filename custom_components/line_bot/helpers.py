@@ -1,31 +1,124 @@
 """Helper functions for Line Bot integration."""
 
-from functools import partial
+from __future__ import annotations
 
-from linebot import LineBotApi
+from itertools import count
+import math
+from typing import Any
 
+from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DOMAIN
+from .client import LineBotClient
+from .const import (
+    CONF_ALLOWED_CHAT_IDS,
+    CONF_CHAT_ID,
+    DOMAIN,
+    SPREAD_FIRST,
+    SPREAD_MOST_REMAINING,
+    SPREAD_ROUND_ROBIN,
+)
+from .exceptions import ChannelNotFound, ChatIdNotFound
+from .metrics import Metrics
 
 
-async def get_quota(hass: HomeAssistant, access_token: str):
-    """Get quota for the Line Bot API."""
-    line_bot = LineBotApi(access_token)
+def create_client(
+    hass: HomeAssistant, access_token: str, metrics: Metrics | None = None
+) -> LineBotClient:
+    """Create a Line Bot client on the shared aiohttp session."""
+    return LineBotClient(async_get_clientsession(hass), access_token, metrics=metrics)
 
-    await hass.loop.run_in_executor(
-        None, partial(line_bot.get_message_quota_consumption)
-    )
 
+def get_channels(hass: HomeAssistant) -> dict[str, dict[str, Any]]:
+    """Get the data of every loaded channel by config entry ID."""
+    return hass.data.get(DOMAIN, {}).get("entry", {})
 
-def get_config_entry(hass: HomeAssistant):
-    """Get the config entry."""
-    entry_data = hass.data.get(DOMAIN, {}).get("entry", {})
-    entry_id, data = next(iter(entry_data.items()), (None, None))
-    return hass.config_entries.async_get_entry(entry_id)
 
-
-def get_data(hass: HomeAssistant):
-    """Get the data."""
-    entry_id, data = next(iter(hass.data[DOMAIN]["entry"].items()))
+def get_data(hass: HomeAssistant, entry_id: str | None = None) -> dict[str, Any]:
+    """Get the data of a channel, or of the first channel without an entry ID."""
+    channels = get_channels(hass)
+    if entry_id is None:
+        if not channels:
+            raise ChannelNotFound("No Line Bot channel is loaded")
+        return next(iter(channels.values()))
+    if (data := channels.get(entry_id)) is None:
+        raise ChannelNotFound(f"Line Bot channel {entry_id} is not loaded")
     return data
+
+
+def get_client(hass: HomeAssistant, entry_id: str | None = None) -> LineBotClient:
+    """Get the Line Bot client of a channel."""
+    return get_data(hass, entry_id)["client"]
+
+
+def get_content_store(hass: HomeAssistant, entry_id: str | None = None):
+    """Get the message content store of a channel."""
+    return get_data(hass, entry_id)["content"]
+
+
+def get_media_store(hass: HomeAssistant):
+    """Get the store serving local media to Line."""
+    return hass.data[DOMAIN]["media"]
+
+
+def build_chat_index(entry: ConfigEntry) -> tuple[dict[str, str], dict[str, str]]:
+    """Build name to chat_id and chat_id to name indexes of allowed chats."""
+    chat_ids = {
+        name: value[CONF_CHAT_ID]
+        for name, value in entry.data.get(CONF_ALLOWED_CHAT_IDS, {}).items()
+    }
+    return chat_ids, {chat_id: name for name, chat_id in chat_ids.items()}
+
+
+def get_chat_ids(hass: HomeAssistant, entry_id: str | None = None) -> dict[str, str]:
+    """Get chat IDs of allowed chats of a channel by name."""
+    return get_data(hass, entry_id)["chat_ids"]
+
+
+def select_channel(
+    hass: HomeAssistant,
+    name: str,
+    entry_id: str | None = None,
+    spread: str | None = None,
+) -> tuple[dict[str, Any], str]:
+    """Select the channel to send to an allowed chat by.
+
+    Without an entry ID, the chat is looked up in every channel, and one of
+    the channels allowing it is picked by the spread policy. Returns the
+    data of the channel and the chat ID.
+    """
+    if entry_id is not None:
+        chat_ids = get_chat_ids(hass, entry_id)
+        if (chat_id := chat_ids.get(name)) is None:
+            raise ChatIdNotFound(name, chat_ids)
+        return get_data(hass, entry_id), chat_id
+
+    channels = get_channels(hass).values()
+    candidates = [data for data in channels if name in data["chat_ids"]]
+    if not candidates:
+        raise ChatIdNotFound(
+            name, dict.fromkeys(key for data in channels for key in data["chat_ids"])
+        )
+    data = pick_channel(hass, candidates, spread or SPREAD_FIRST)
+    return data, data["chat_ids"][name]
+
+
+def pick_channel(
+    hass: HomeAssistant, candidates: list[dict[str, Any]], spread: str
+) -> dict[str, Any]:
+    """Pick one of the channels able to send a message, by a spread policy."""
+    if len(candidates) == 1 or spread == SPREAD_FIRST:
+        return candidates[0]
+    if spread == SPREAD_ROUND_ROBIN:
+        turns = hass.data[DOMAIN].setdefault("round_robin", count())
+        return candidates[next(turns) % len(candidates)]
+    if spread == SPREAD_MOST_REMAINING:
+        return max(candidates, key=get_remaining)
+    raise ValueError(f"Unknown spread policy {spread}")
+
+
+def get_remaining(data: dict[str, Any]) -> tuple[float, int]:
+    """Rank a channel by its remaining message quota, then by its queued pushes."""
+    remaining = data["coordinator"].remaining
+    return (math.inf if remaining is None else remaining, -data["queue"].pending)
@@ -1,171 +1,567 @@
 """Webhook for Line Bot."""
 
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+import json
 import logging
+import time
+from typing import Any
 from urllib.parse import parse_qsl
 
+from aiohttp import ClientError
 from aiohttp.web import Request, Response
 from aiohttp.web_exceptions import HTTPBadRequest, HTTPNotFound
-from linebot import LineBotApi, WebhookParser
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import (
-    MessageEvent,
-    PostbackEvent,
-    SourceGroup,
-    SourceRoom,
-    TextSendMessage,
-)
 
 from homeassistant.components.http import HomeAssistantView
-from homeassistant.const import CONF_ACCESS_TOKEN
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.util.decorator import Registry
 
 from .const import (
-    CONF_ALLOWED_CHAT_IDS,
     CONF_CHANNEL_SECRET,
-    CONF_CHAT_ID,
+    CONF_FETCH_CONTENT,
+    CONF_FETCH_PROFILES,
     CONF_NEW_MESSAGES,
+    CONF_PAYLOAD_PROFILE,
+    CONF_PREFER_REPLY,
+    EVENT_WEBHOOK_ACCOUNT_LINK_RECEIVED,
+    EVENT_WEBHOOK_AUDIO_RECEIVED,
+    EVENT_WEBHOOK_BEACON_RECEIVED,
+    EVENT_WEBHOOK_EVENT_RECEIVED,
+    EVENT_WEBHOOK_FILE_RECEIVED,
+    EVENT_WEBHOOK_FOLLOW_RECEIVED,
+    EVENT_WEBHOOK_IMAGE_RECEIVED,
+    EVENT_WEBHOOK_JOIN_RECEIVED,
+    EVENT_WEBHOOK_LEAVE_RECEIVED,
+    EVENT_WEBHOOK_LOCATION_RECEIVED,
+    EVENT_WEBHOOK_MEMBER_JOINED_RECEIVED,
+    EVENT_WEBHOOK_MEMBER_LEFT_RECEIVED,
     EVENT_WEBHOOK_POSTBACK_RECEIVED,
+    EVENT_WEBHOOK_STICKER_RECEIVED,
     EVENT_WEBHOOK_TEXT_RECEIVED,
+    EVENT_WEBHOOK_THINGS_RECEIVED,
+    EVENT_WEBHOOK_UNFOLLOW_RECEIVED,
+    EVENT_WEBHOOK_UNSEND_RECEIVED,
+    EVENT_WEBHOOK_VIDEO_PLAY_COMPLETE_RECEIVED,
+    EVENT_WEBHOOK_VIDEO_RECEIVED,
+    NEW_MESSAGE_PREVIEW_LENGTH,
+    PAYLOAD_PROFILE_FULL,
+    PAYLOAD_PROFILE_MINIMAL,
+    REPLY_TOKEN_TTL,
+    WEBHOOK_API_TIMEOUT,
 )
-from .helpers import get_config_entry, get_data
+from .cache import TTLCache
+from .client import LineBotClient
+from .events import WebhookEvent, validate_signature
+from .exceptions import LineApiError
+from .helpers import get_channels, get_data, get_media_store
+from .media import LineMediaView
 
 HANDLERS = Registry()
+CONTENT_MESSAGE_EVENTS = {
+    "image": EVENT_WEBHOOK_IMAGE_RECEIVED,
+    "video": EVENT_WEBHOOK_VIDEO_RECEIVED,
+    "audio": EVENT_WEBHOOK_AUDIO_RECEIVED,
+    "file": EVENT_WEBHOOK_FILE_RECEIVED,
+}
+MEMBERSHIP_EVENTS = {
+    "follow": EVENT_WEBHOOK_FOLLOW_RECEIVED,
+    "unfollow": EVENT_WEBHOOK_UNFOLLOW_RECEIVED,
+    "join": EVENT_WEBHOOK_JOIN_RECEIVED,
+    "leave": EVENT_WEBHOOK_LEAVE_RECEIVED,
+    "memberJoined": EVENT_WEBHOOK_MEMBER_JOINED_RECEIVED,
+    "memberLeft": EVENT_WEBHOOK_MEMBER_LEFT_RECEIVED,
+}
 _LOGGER = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class NewChat:
+    """Compact record of a message from a chat that is not allowed yet."""
+
+    chat_id: str
+    source_type: str
+    preview: str
+    timestamp: float
+
+    @classmethod
+    def from_event(cls, event: WebhookEvent) -> NewChat:
+        """Create a record from an event."""
+        preview = (event.message or {}).get("text") or f"[{event.type}]"
+        return cls(
+            chat_id=event.chat_id,
+            source_type=event.source_type,
+            preview=preview[:NEW_MESSAGE_PREVIEW_LENGTH],
+            timestamp=time.time(),
+        )
+
+
 @callback
 def async_register_http(hass: HomeAssistant):
-    """Register the webhook."""
+    """Register the webhook and the media view."""
     hass.http.register_view(LineWebhookView(hass))
+    hass.http.register_view(LineMediaView(get_media_store(hass)))
+
+
+@callback
+def async_call_api(hass: HomeAssistant, target: Coroutine) -> None:
+    """Run an outbound API call of the webhook in the background.
+
+    The call never runs inside the request handling, and it is bounded by
+    WEBHOOK_API_TIMEOUT so a slow Line API can't pile up pending tasks.
+    """
+
+    async def _run():
+        try:
+            async with asyncio.timeout(WEBHOOK_API_TIMEOUT):
+                await target
+        except TimeoutError:
+            _LOGGER.warning("Timed out calling Line API from webhook")
+        except (ClientError, LineApiError) as err:
+            _LOGGER.error("Error calling Line API from webhook: %s", err)
+
+    hass.async_create_background_task(_run(), "line_bot webhook api call")
 
 
 class LineWebhookView(HomeAssistantView):
-    """Handle Line Webhook."""
+    """Handle Line Webhook.
+
+    Each channel has its own webhook at /api/line/callback/<entry_id>. The
+    plain /api/line/callback is kept for existing setups, and goes to the
+    channel whose secret matches the signature.
+    """
 
-    url = "/api/line/callback"
+    url = "/api/line/callback/{entry_id}"
+    extra_urls = ["/api/line/callback"]
     name = "api:line_bot"
     requires_auth = False
 
     def __init__(self, hass: HomeAssistant) -> None:
         """Initialize the view."""
         self.hass = hass
-        config_entry_data = get_config_entry(hass).data
-        self.line_bot_api = LineBotApi(config_entry_data[CONF_ACCESS_TOKEN])
-        self.parser = WebhookParser(config_entry_data.get(CONF_CHANNEL_SECRET))
-
-    async def post(self, request: Request) -> Response:
-        """Handle Webhook."""
-        config_entry = get_config_entry(self.hass)
-        if config_entry is None:
+
+    async def post(self, request: Request, entry_id: str | None = None) -> Response:
+        """Handle Webhook.
+
+        Events are only queued here and handled by the workers of the
+        dispatcher, so Line gets its response right away.
+        """
+        channels = get_channels(self.hass)
+        if entry_id is None:
+            candidates = list(channels.values())
+        elif entry_id in channels:
+            candidates = [channels[entry_id]]
+        else:
+            candidates = []
+        if not candidates:
             raise HTTPNotFound
 
-        # get X-Line-Signature header value
-        signature = request.headers["X-Line-Signature"]
-        body = await request.text()
-        # parse webhook body
+        start = time.monotonic()
+        # verify X-Line-Signature on the raw body and parse it only once
+        signature = request.headers.get("X-Line-Signature", "")
+        body = await request.read()
+        data = next(
+            (
+                data
+                for data in candidates
+                if validate_signature(data[CONF_CHANNEL_SECRET], body, signature)
+            ),
+            None,
+        )
+        if data is None:
+            _LOGGER.error("Invalid signature. signature=%s", signature)
+            raise HTTPBadRequest
         try:
-            events = self.parser.parse(body, signature)
-        except InvalidSignatureError as e:
-            _LOGGER.error(e)
+            events = parse_events(body)
+        except ValueError as e:
+            _LOGGER.error("Invalid webhook body: %s", e)
             raise HTTPBadRequest from e
 
+        dispatcher = data["dispatcher"]
+        seen_events = data["seen_events"]
         for event in events:
-            if self.is_test(event.reply_token):
-                return "OK"
-            if not self.is_allowed(event):
-                chat_id = self.get_chat_id(event.source)
-                get_data(self.hass).setdefault(CONF_NEW_MESSAGES, {})[chat_id] = event
-                raise HTTPBadRequest
-
-            handler_keys = [event.__class__.__name__]
-            if hasattr(event, "message"):
-                handler_keys.append(event.message.__class__.__name__)
-            handler = HANDLERS.get("_".join(handler_keys))
-            handler(self.hass, self.line_bot_api, event)
+            if not is_duplicate(seen_events, WebhookEvent(event, data["entry_id"])):
+                dispatcher.async_put(event)
+        data["metrics"].record_webhook(len(events), time.monotonic() - start)
         return "OK"
 
-    def is_test(self, reply_token):
-        """Check if the event is a test event."""
-        if reply_token == "00000000000000000000000000000000":
-            return True
+
+def parse_events(body: bytes) -> list[dict[str, Any]]:
+    """Parse the events of a webhook request body, checking their shape."""
+    payload = json.loads(body)
+    events = payload.get("events") if isinstance(payload, dict) else None
+    if not isinstance(events, list) or not all(
+        isinstance(event, dict) for event in events
+    ):
+        raise ValueError("Body has no list of events")
+    return events
+
+
+async def async_handle_event(
+    hass: HomeAssistant, entry_id: str, raw_event: dict[str, Any]
+) -> None:
+    """Handle a single event of a webhook batch of a channel."""
+    event = WebhookEvent(raw_event, entry_id)
+    if event.is_test:
+        return
+    data = get_data(hass, entry_id)
+    if event.chat_id not in data["chat_names"]:
+        data[CONF_NEW_MESSAGES].set(event.chat_id, NewChat.from_event(event))
+        return
+    if data[CONF_PREFER_REPLY] and event.reply_token:
+        remember_reply_token(data["reply_tokens"], event)
+    if not data[CONF_FETCH_PROFILES]:
+        fire_event(hass, data, event)
+        return
+
+    # Lookups of a chat's events run at the same time, but the events are
+    # still fired in the order they came in
+    previous = data["enriching"].get(event.chat_id)
+    done = data["enriching"][event.chat_id] = hass.loop.create_future()
+    try:
+        event.profiles = await data["profiles"].async_enrich(event)
+        if previous is not None:
+            await asyncio.shield(previous)
+        fire_event(hass, data, event)
+    finally:
+        done.set_result(None)
+        if data["enriching"].get(event.chat_id) is done:
+            del data["enriching"][event.chat_id]
+
+
+def fire_event(hass: HomeAssistant, data: dict[str, Any], event: WebhookEvent) -> None:
+    """Fire the Home Assistant event of a webhook event."""
+    handler = HANDLERS.get((event.type, event.message_type), handle_unknown_event)
+    handler(hass, data["client"], event)
+
+
+def remember_reply_token(reply_tokens: TTLCache, event: WebhookEvent) -> None:
+    """Keep the reply token of an event to reply to its chat with.
+
+    It expires REPLY_TOKEN_TTL seconds after Line sent the event, so an event
+    that waited in the dispatcher or was redelivered keeps it for less.
+    """
+    ttl = REPLY_TOKEN_TTL
+    if (timestamp := event.timestamp) is not None:
+        ttl = min(ttl, REPLY_TOKEN_TTL - (time.time() - timestamp))
+    if ttl > 0:
+        reply_tokens.set(event.chat_id, event.reply_token, ttl)
+
+
+def is_duplicate(seen_events: TTLCache, event: WebhookEvent) -> bool:
+    """Check if a redelivered event was handled already, remembering new events.
+
+    Only redelivered events are looked up, since Line sends any other event
+    once.
+    """
+    event_id = event.webhook_event_id
+    if event_id is None:
         return False
+    if event.is_redelivery and seen_events.get(event_id):
+        _LOGGER.debug("Ignoring redelivered event %s", event_id)
+        return True
+    seen_events.set(event_id, True)
+    return False
+
 
-    def get_chat_id(self, source):
-        """Get chat id from source."""
-        if source.type == "user":
-            return source.user_id
-        elif source.type == "group":
-            return source.group_id
-        elif source.type == "room":
-            return source.room_id
-        return None
-
-    def is_allowed(self, event):
-        """Check if the event is allowed."""
-        return self.get_chat_id(event.source) in self.get_allowed_chat_ids()
-
-    def get_allowed_chat_ids(self):
-        """Get allowed chat ids."""
-        config_entry_data = get_config_entry(self.hass).data
-        return [
-            value[CONF_CHAT_ID]
-            for value in config_entry_data.get(CONF_ALLOWED_CHAT_IDS, {}).values()
-        ]
-
-
-@HANDLERS.register("MessageEvent_TextMessage")
+@HANDLERS.register(("message", "text"))
 def handle_message_event_text_message(
-    hass: HomeAssistant, line_bot_api: LineBotApi, event: MessageEvent
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
 ):
     """Handle text message."""
-    text = event.message.text
+    text = event.message["text"]
     if text == "bye":
-        exit_chat(line_bot_api, event)
+        get_data(hass, event.entry_id)["reply_tokens"].pop(event.chat_id)
+        async_call_api(hass, exit_chat(client, event))
         return
 
-    hass.bus.fire(
+    hass.bus.async_fire(
         EVENT_WEBHOOK_TEXT_RECEIVED,
-        {
-            "reply_token": event.reply_token,
-            "event": event.as_json_dict(),
-            "content": event.message.as_json_dict(),
-            "text": event.message.text,
-        },
+        build_event_data(hass, event, event.message, {"text": text}),
     )
 
 
-@HANDLERS.register("PostbackEvent")
+@HANDLERS.register(("postback", None))
 def handle_postback_event_message(
-    hass: HomeAssistant, line_bot_api: LineBotApi, event: PostbackEvent
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
 ):
     """Handle postback."""
-    hass.bus.fire(
+    postback = event.postback
+    hass.bus.async_fire(
         EVENT_WEBHOOK_POSTBACK_RECEIVED,
-        {
-            "reply_token": event.reply_token,
-            "event": event.as_json_dict(),
-            "content": event.postback.as_json_dict(),
-            "data": event.postback.data,
-            "data_json": dict(parse_qsl(event.postback.data)),
-            "params": event.postback.params,
-        },
+        build_event_data(
+            hass,
+            event,
+            postback,
+            {"data": postback["data"], "params": postback.get("params")},
+            lambda: {"data_json": dict(parse_qsl(postback["data"]))},
+        ),
     )
 
 
-def exit_chat(line_bot_api: LineBotApi, event: MessageEvent):
+@HANDLERS.register(("message", "image"))
+@HANDLERS.register(("message", "video"))
+@HANDLERS.register(("message", "audio"))
+@HANDLERS.register(("message", "file"))
+def handle_message_event_content_message(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle image, video, audio and file messages.
+
+    When content fetching is on, the event is fired once the content is
+    downloaded, with the path of the file.
+    """
+    message = event.message
+    fields = {
+        "message_id": message["id"],
+        "file_name": message.get("fileName"),
+        "path": None,
+    }
+    provider = (message.get("contentProvider") or {}).get("type", "line")
+    if get_data(hass, event.entry_id)[CONF_FETCH_CONTENT] and provider == "line":
+        hass.async_create_background_task(
+            async_fire_content_event(hass, event, fields),
+            f"line_bot fetch content {message['id']}",
+        )
+        return
+
+    hass.bus.async_fire(
+        CONTENT_MESSAGE_EVENTS[message["type"]],
+        build_event_data(hass, event, message, fields),
+    )
+
+
+async def async_fire_content_event(
+    hass: HomeAssistant, event: WebhookEvent, fields: dict[str, Any]
+) -> None:
+    """Download the content of a message, then fire its event."""
+    try:
+        content = get_data(hass, event.entry_id)["content"]
+        fields["path"] = await content.async_get(fields["message_id"])
+    except (ClientError, LineApiError, OSError, TimeoutError) as err:
+        _LOGGER.error(
+            "Failed to fetch content of message %s: %s", fields["message_id"], err
+        )
+    hass.bus.async_fire(
+        CONTENT_MESSAGE_EVENTS[event.message_type],
+        build_event_data(hass, event, event.message, fields),
+    )
+
+
+@HANDLERS.register(("message", "location"))
+def handle_message_event_location_message(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle location message."""
+    message = event.message
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_LOCATION_RECEIVED,
+        build_event_data(
+            hass,
+            event,
+            message,
+            {
+                "title": message.get("title"),
+                "address": message.get("address"),
+                "latitude": message["latitude"],
+                "longitude": message["longitude"],
+            },
+        ),
+    )
+
+
+@HANDLERS.register(("message", "sticker"))
+def handle_message_event_sticker_message(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle sticker message."""
+    message = event.message
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_STICKER_RECEIVED,
+        build_event_data(
+            hass,
+            event,
+            message,
+            {"package_id": message["packageId"], "sticker_id": message["stickerId"]},
+        ),
+    )
+
+
+@HANDLERS.register(("follow", None))
+@HANDLERS.register(("unfollow", None))
+@HANDLERS.register(("join", None))
+@HANDLERS.register(("leave", None))
+def handle_membership_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle follow, unfollow, join and leave."""
+    hass.bus.async_fire(
+        MEMBERSHIP_EVENTS[event.type],
+        build_event_data(hass, event, None, {"chat_id": event.chat_id}),
+    )
+
+
+@HANDLERS.register(("memberJoined", None))
+@HANDLERS.register(("memberLeft", None))
+def handle_member_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle members joining or leaving a group or room."""
+    content = event.raw["joined" if event.type == "memberJoined" else "left"]
+    hass.bus.async_fire(
+        MEMBERSHIP_EVENTS[event.type],
+        build_event_data(
+            hass,
+            event,
+            content,
+            {
+                "chat_id": event.chat_id,
+                "user_ids": [member.get("userId") for member in content["members"]],
+            },
+        ),
+    )
+
+
+@HANDLERS.register(("beacon", None))
+def handle_beacon_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle beacon."""
+    beacon = event.raw["beacon"]
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_BEACON_RECEIVED,
+        build_event_data(
+            hass,
+            event,
+            beacon,
+            {"hwid": beacon["hwid"], "type": beacon["type"], "dm": beacon.get("dm")},
+        ),
+    )
+
+
+@HANDLERS.register(("accountLink", None))
+def handle_account_link_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle account link."""
+    link = event.raw["link"]
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_ACCOUNT_LINK_RECEIVED,
+        build_event_data(
+            hass, event, link, {"result": link["result"], "nonce": link["nonce"]}
+        ),
+    )
+
+
+@HANDLERS.register(("things", None))
+def handle_things_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle LINE Things."""
+    things = event.raw["things"]
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_THINGS_RECEIVED,
+        build_event_data(
+            hass,
+            event,
+            things,
+            {"device_id": things["deviceId"], "type": things["type"]},
+        ),
+    )
+
+
+@HANDLERS.register(("unsend", None))
+def handle_unsend_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle unsent message."""
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_UNSEND_RECEIVED,
+        build_event_data(
+            hass, event, None, {"message_id": event.raw["unsend"]["messageId"]}
+        ),
+    )
+
+
+@HANDLERS.register(("videoPlayComplete", None))
+def handle_video_play_complete_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle video viewing completion."""
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_VIDEO_PLAY_COMPLETE_RECEIVED,
+        build_event_data(
+            hass,
+            event,
+            None,
+            {"tracking_id": event.raw["videoPlayComplete"]["trackingId"]},
+        ),
+    )
+
+
+def handle_unknown_event(
+    hass: HomeAssistant, client: LineBotClient, event: WebhookEvent
+):
+    """Handle events and messages of types without a handler."""
+    _LOGGER.debug("No handler for event %s %s", event.type, event.message_type)
+    hass.bus.async_fire(
+        EVENT_WEBHOOK_EVENT_RECEIVED,
+        build_event_data(
+            hass,
+            event,
+            event.message,
+            {"type": event.type, "message_type": event.message_type},
+        ),
+    )
+
+
+def build_event_data(
+    hass: HomeAssistant,
+    event: WebhookEvent,
+    content: dict[str, Any] | None,
+    fields: dict[str, Any],
+    derived: Callable[[], dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    """Build bus event data for the configured payload profile.
+
+    The minimal profile only has the reply token, the channel to reply
+    through, the looked up profiles and the fields most automations read,
+    standard adds the content and source, and full adds the raw event and
+    fields derived from it.
+    """
+    profile = get_data(hass, event.entry_id)[CONF_PAYLOAD_PROFILE]
+    data = {
+        "reply_token": event.reply_token,
+        "channel": event.entry_id,
+        **event.profiles,
+        **fields,
+    }
+    if profile == PAYLOAD_PROFILE_MINIMAL:
+        return data
+    data["content"] = content
+    data["source"] = event.source
+    if profile == PAYLOAD_PROFILE_FULL:
+        data["event"] = event.raw
+        if derived is not None:
+            data.update(derived())
+    return data
+
+
+async def exit_chat(client: LineBotClient, event: WebhookEvent):
     """Exit chat."""
-    if isinstance(event.source, SourceGroup):
-        line_bot_api.reply_message(
-            event.reply_token, TextSendMessage(text="Leaving group")
+    if event.source_type == "group":
+        await client.reply_message(
+            event.reply_token, {"type": "text", "text": "Leaving group"}
         )
-        line_bot_api.leave_group(event.source.group_id)
-    elif isinstance(event.source, SourceRoom):
-        line_bot_api.reply_message(
-            event.reply_token, TextSendMessage(text="Leaving group")
+        await client.leave_group(event.chat_id)
+    elif event.source_type == "room":
+        await client.reply_message(
+            event.reply_token, {"type": "text", "text": "Leaving group"}
         )
-        line_bot_api.leave_room(event.source.room_id)
+        await client.leave_room(event.chat_id)
     else:
-        line_bot_api.reply_message(
-            event.reply_token, TextSendMessage(text="Bot can't leave from 1:1 chat")
+        await client.reply_message(
+            event.reply_token, {"type": "text", "text": "Bot can't leave from 1:1 chat"}
         )
@@ -0,0 +1,293 @@
+"""Local media hosting for Line Bot integration."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import secrets
+import time
+
+from aiohttp.web import FileResponse, Request
+from aiohttp.web_exceptions import HTTPForbidden, HTTPNotFound
+
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.network import NoURLAvailableError, get_url
+
+from .cache import TTLCache
+from .const import (
+    MEDIA_CACHE_SIZE,
+    MEDIA_PREVIEW_SIZE,
+    MEDIA_PRUNE_INTERVAL,
+    MEDIA_URL_PATH,
+    MEDIA_URL_TTL,
+)
+from .exceptions import MediaError
+
+_LOGGER = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+VARIANT_ORIGINAL = "original"
+VARIANT_PREVIEW = "preview"
+
+
+@dataclass(slots=True)
+class MediaFile:
+    """Local file prepared for sending, with its preview and duration."""
+
+    content_hash: str
+    path: str
+    content_type: str | None
+    preview_path: str | None
+    duration: int | None
+
+    def get_path(self, variant: str) -> str | None:
+        """Get the path of the original or the preview."""
+        if variant == VARIANT_PREVIEW:
+            return self.preview_path or self.path
+        if variant == VARIANT_ORIGINAL:
+            return self.path
+        return None
+
+
+class MediaStore:
+    """Serve local files to Line through signed, time-limited URLs.
+
+    Files are identified by the hash of their content, so previews and
+    durations are made once per content and reused on every later send.
+    Previews are kept on disk while their file is in the store, and links
+    stop working after MEDIA_URL_TTL seconds or when Home Assistant restarts.
+    """
+
+    def __init__(self, hass: HomeAssistant, directory: str) -> None:
+        """Initialize the store."""
+        self.hass = hass
+        self.directory = directory
+        self._key = secrets.token_bytes(32)
+        self._hashes: TTLCache[tuple[str, int, int], str] = TTLCache(
+            MEDIA_CACHE_SIZE, MEDIA_URL_TTL
+        )
+        self._files: TTLCache[str, MediaFile] = TTLCache(
+            MEDIA_CACHE_SIZE, MEDIA_URL_TTL
+        )
+
+    @callback
+    def async_start(self) -> None:
+        """Delete previews left by the last run, then prune them periodically."""
+        async_track_time_interval(
+            self.hass,
+            self._async_prune,
+            timedelta(seconds=MEDIA_PRUNE_INTERVAL),
+            cancel_on_shutdown=True,
+        )
+        self.hass.async_create_background_task(
+            self._async_prune(), "line_bot media prune"
+        )
+
+    async def async_get(self, path: str) -> MediaFile:
+        """Prepare a local file for sending."""
+        if not self.hass.config.is_allowed_path(path):
+            raise MediaError(
+                f"Cannot read {path}, no access to path; "
+                "`allowlist_external_dirs` may need to be adjusted in "
+                "`configuration.yaml`"
+            )
+        try:
+            stat = await self.hass.async_add_executor_job(os.stat, path)
+        except OSError as err:
+            raise MediaError(f"Cannot read {path}: {err}") from err
+
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if (content_hash := self._hashes.get(key)) is not None and (
+            media := self._files.get(content_hash)
+        ) is not None:
+            self._hashes.set(key, content_hash)
+            return media
+
+        try:
+            media = await self.hass.async_add_executor_job(
+                _prepare, path, self.directory
+            )
+        except OSError as err:
+            raise MediaError(f"Cannot prepare {path}: {err}") from err
+        self._hashes.set(key, media.content_hash)
+        self._files.set(media.content_hash, media)
+        return media
+
+    def get_file(self, content_hash: str) -> MediaFile | None:
+        """Get a prepared file by the hash of its content."""
+        return self._files.get(content_hash)
+
+    def sign_url(self, media: MediaFile, variant: str) -> str:
+        """Get an external URL for the original or the preview of a file.
+
+        The file is kept for MEDIA_URL_TTL seconds from now, so it is served
+        until the URL expires.
+        """
+        try:
+            base_url = get_url(self.hass, allow_internal=False, require_ssl=True)
+        except NoURLAvailableError as err:
+            raise MediaError(
+                "Line needs an external https URL of Home Assistant to fetch media"
+            ) from err
+        self._files.set(media.content_hash, media)
+        expires = int(time.time()) + MEDIA_URL_TTL
+        signature = self._sign(media.content_hash, variant, expires)
+        return (
+            f"{base_url}{MEDIA_URL_PATH}/{media.content_hash}/{variant}"
+            f"?expires={expires}&signature={signature}"
+        )
+
+    def verify(
+        self, content_hash: str, variant: str, expires: str, signature: str
+    ) -> bool:
+        """Check the signature of a URL and that it is not expired."""
+        try:
+            if int(expires) < time.time():
+                return False
+        except ValueError:
+            return False
+        return hmac.compare_digest(
+            self._sign(content_hash, variant, expires), signature
+        )
+
+    async def _async_prune(self, _now: datetime | None = None) -> None:
+        """Delete previews of files that expired or were evicted from the store."""
+        keep = {
+            media.preview_path
+            for _, media in self._files.items()
+            if media.preview_path is not None
+        }
+        try:
+            removed = await self.hass.async_add_executor_job(
+                _prune, self.directory, keep
+            )
+        except OSError as err:
+            _LOGGER.warning("Failed to prune previews in %s: %s", self.directory, err)
+            return
+        if removed:
+            _LOGGER.debug("Deleted %s previews no longer used", removed)
+
+    def _sign(self, content_hash: str, variant: str, expires: int | str) -> str:
+        return hmac.new(
+            self._key, f"{content_hash}/{variant}/{expires}".encode(), hashlib.sha256
+        ).hexdigest()
+
+
+class LineMediaView(HomeAssistantView):
+    """Serve media to Line through signed URLs."""
+
+    url = MEDIA_URL_PATH + "/{content_hash}/{variant}"
+    name = "api:line_bot:media"
+    requires_auth = False
+
+    def __init__(self, store: MediaStore) -> None:
+        """Initialize the view."""
+        self.store = store
+
+    async def get(self, request: Request, content_hash: str, variant: str):
+        """Serve a file if its signed URL is valid."""
+        if not self.store.verify(
+            content_hash,
+            variant,
+            request.query.get("expires", ""),
+            request.query.get("signature", ""),
+        ):
+            raise HTTPForbidden
+        media = self.store.get_file(content_hash)
+        if media is None or (path := media.get_path(variant)) is None:
+            raise HTTPNotFound
+        return FileResponse(path)
+
+
+def _prepare(path: str, directory: str) -> MediaFile:
+    """Hash a file and make its preview or read its duration."""
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            content_hash.update(chunk)
+    media = MediaFile(
+        content_hash=content_hash.hexdigest(),
+        path=path,
+        content_type=mimetypes.guess_type(path)[0],
+        preview_path=None,
+        duration=None,
+    )
+    if media.content_type and media.content_type.startswith("image/"):
+        media.preview_path = _make_preview(media, directory)
+    elif media.content_type and media.content_type.startswith("audio/"):
+        media.duration = _read_duration(path)
+    return media
+
+
+def _make_preview(media: MediaFile, directory: str) -> str | None:
+    """Make a downscaled JPEG preview, unless it was made already.
+
+    Needs Pillow. Without it, the original is used as the preview.
+    """
+    preview_path = os.path.join(directory, f"{media.content_hash}.jpg")
+    if os.path.exists(preview_path):
+        # keep it from being pruned before the store holds it again
+        os.utime(preview_path)
+        return preview_path
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        from PIL import Image
+    except ImportError:
+        _LOGGER.debug("Pillow is not installed, using %s as preview", media.path)
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    partial_path = preview_path + ".part"
+    with Image.open(media.path) as image:
+        image.thumbnail(MEDIA_PREVIEW_SIZE)
+        image.convert("RGB").save(partial_path, "JPEG")
+    os.replace(partial_path, preview_path)
+    return preview_path
+
+
+def _prune(directory: str, keep: set[str]) -> int:
+    """Delete previews not in `keep`, returning how many were deleted.
+
+    Previews written during the last MEDIA_PRUNE_INTERVAL seconds are kept,
+    since their file may not be in the store yet.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - MEDIA_PRUNE_INTERVAL
+    removed = 0
+    for name in names:
+        path = os.path.join(directory, name)
+        if path in keep or os.path.getmtime(path) > cutoff:
+            continue
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def _read_duration(path: str) -> int | None:
+    """Read the duration of an audio file in milliseconds.
+
+    Needs mutagen. Without it, the duration has to be given when sending.
+    """
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        import mutagen
+    except ImportError:
+        return None
+    try:
+        audio = mutagen.File(path)
+    except mutagen.MutagenError as err:
+        _LOGGER.warning("Failed to read duration of %s: %s", path, err)
+        return None
+    if audio is None or audio.info is None:
+        return None
+    return int(audio.info.length * 1000)
@@ -0,0 +1,151 @@
+"""Request metrics for Line Bot integration."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import defaultdict
+import re
+from typing import Any
+
+from .const import LATENCY_BUCKETS
+
+ID_SEGMENT = re.compile(r"/(?:[CRU][0-9a-f]{32}|\d+)(?=/|$)")
+STATUS_ERROR = "error"
+
+
+def to_endpoint(path: str) -> str:
+    """Replace chat and message IDs in an API path, to group requests by endpoint."""
+    return ID_SEGMENT.sub("/{id}", path)
+
+
+class Histogram:
+    """Latency histogram in milliseconds over the fixed LATENCY_BUCKETS."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize the histogram."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float | None:
+        """Return the mean value."""
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a quantile as the upper bound of the bucket holding it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a summary of the histogram."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": dict(
+                zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.counts, strict=True)
+            ),
+        }
+
+
+class Metrics:
+    """Counters and latency histograms of a config entry.
+
+    Outbound requests are counted by endpoint and status, and timed by
+    endpoint. Webhook requests are timed from receiving the request until
+    its events are queued, and events from a worker taking them off the queue
+    until they are handled.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.requests: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self.latency: defaultdict[str, Histogram] = defaultdict(Histogram)
+        self.webhook_latency = Histogram()
+        self.handle_latency = Histogram()
+        self.webhook_requests = 0
+        self.webhook_events = 0
+
+    @property
+    def sent(self) -> int:
+        """Return the number of successful requests."""
+        return sum(
+            count
+            for (_, status), count in self.requests.items()
+            if status.startswith("2")
+        )
+
+    @property
+    def failed(self) -> int:
+        """Return the number of failed requests."""
+        return sum(
+            count
+            for (_, status), count in self.requests.items()
+            if not status.startswith("2")
+        )
+
+    @property
+    def send_latency(self) -> Histogram:
+        """Return the latency of requests to every endpoint."""
+        merged = Histogram()
+        for histogram in self.latency.values():
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.count += histogram.count
+            merged.total += histogram.total
+            merged.max = max(merged.max, histogram.max)
+        return merged
+
+    def record_request(self, path: str, status: int | str, duration: float) -> None:
+        """Record an outbound request, with its duration in seconds."""
+        endpoint = to_endpoint(path)
+        self.requests[(endpoint, str(status))] += 1
+        self.latency[endpoint].add(duration * 1000)
+
+    def record_webhook(self, events: int, duration: float) -> None:
+        """Record a webhook request, with its duration in seconds."""
+        self.webhook_requests += 1
+        self.webhook_events += events
+        self.webhook_latency.add(duration * 1000)
+
+    def record_handled(self, duration: float) -> None:
+        """Record the handling of a webhook event, with its duration in seconds."""
+        self.handle_latency.add(duration * 1000)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return every metric."""
+        requests: defaultdict[str, dict[str, int]] = defaultdict(dict)
+        for (endpoint, status), count in self.requests.items():
+            requests[endpoint][status] = count
+        return {
+            "requests": dict(requests),
+            "latency": {
+                endpoint: histogram.as_dict()
+                for endpoint, histogram in self.latency.items()
+            },
+            "webhook": {
+                "requests": self.webhook_requests,
+                "events": self.webhook_events,
+                "latency": self.webhook_latency.as_dict(),
+                "handle_latency": self.handle_latency.as_dict(),
+            },
+        }
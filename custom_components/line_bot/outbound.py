@@ -0,0 +1,185 @@
+"""Outbound message queue for Line Bot integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+import logging
+from typing import Any, NamedTuple
+
+from homeassistant.core import HomeAssistant, callback
+
+from .client import LineBotClient, is_retryable, to_json_dicts
+from .const import MAX_MESSAGES_PER_REQUEST
+from .exceptions import LineApiError
+from .outbox import Outbox
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class QueuedMessages(NamedTuple):
+    """Messages of a single call waiting in the queue."""
+
+    messages: list[dict[str, Any]]
+    future: asyncio.Future
+    record_id: str | None
+
+
+class OutboundQueue:
+    """Coalesce messages pushed to the same chat into fewer requests.
+
+    Messages queued for the same chat within `window` seconds are merged into
+    push requests of up to MAX_MESSAGES_PER_REQUEST messages. Order is kept per
+    chat and every caller waits for the request carrying its messages.
+    Queued messages, and multicasts sent through the queue, are kept in the
+    outbox until Line accepts or rejects them.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: LineBotClient,
+        window: float,
+        outbox: Outbox | None = None,
+    ) -> None:
+        """Initialize the queue."""
+        self.hass = hass
+        self.client = client
+        self.window = window
+        self.outbox = outbox
+        self._pending: dict[str, list[QueuedMessages]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        """Return the number of messages waiting to be sent."""
+        return sum(
+            len(item.messages) for pending in self._pending.values() for item in pending
+        )
+
+    async def async_push(
+        self, to: str, messages, record_id: str | None = None
+    ) -> dict[str, Any]:
+        """Queue messages for a chat and wait until they are sent."""
+        messages = to_json_dicts(messages)
+        if record_id is None and self.outbox is not None:
+            record_id = self.outbox.async_add(to, messages)
+
+        future = self.hass.loop.create_future()
+        pending = self._pending.setdefault(to, [])
+        pending.append(QueuedMessages(messages, future, record_id))
+
+        if sum(len(item.messages) for item in pending) >= MAX_MESSAGES_PER_REQUEST:
+            self._async_flush(to)
+        elif to not in self._timers:
+            self._timers[to] = self.hass.loop.call_later(
+                self.window, self._async_flush, to
+            )
+        return await future
+
+    async def async_multicast(
+        self, to: list[str], messages, record_id: str | None = None
+    ) -> dict[str, Any]:
+        """Send messages to many users at once and wait until they are sent.
+
+        Multicasts aren't coalesced, since each one has its own recipients.
+        """
+        messages = to_json_dicts(messages)
+        if record_id is None and self.outbox is not None:
+            record_id = self.outbox.async_add(to, messages)
+        try:
+            result = await self.client.multicast(to, messages)
+        except Exception as err:
+            if isinstance(err, LineApiError) and not is_retryable(err):
+                self._async_ack([record_id])
+            raise
+        self._async_ack([record_id])
+        return result
+
+    async def async_send(
+        self, to: str | list[str], messages, record_id: str | None = None
+    ) -> dict[str, Any]:
+        """Push messages to a chat, or multicast them to a list of users."""
+        if isinstance(to, list):
+            return await self.async_multicast(to, messages, record_id)
+        return await self.async_push(to, messages, record_id)
+
+    async def async_replay(self, records: list[dict[str, Any]]) -> None:
+        """Send messages left in the outbox by the last run."""
+        results = await asyncio.gather(
+            *(
+                self.async_send(record["to"], record["messages"], record["id"])
+                for record in records
+            ),
+            return_exceptions=True,
+        )
+        for record, result in zip(records, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning(
+                    "Failed to resend queued messages to %s: %s", record["to"], result
+                )
+
+    async def async_shutdown(self) -> None:
+        """Send every pending message right away."""
+        for to in list(self._pending):
+            self._async_flush(to)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.outbox is not None:
+            await self.outbox.async_flush()
+
+    @callback
+    def _async_flush(self, to: str) -> None:
+        if timer := self._timers.pop(to, None):
+            timer.cancel()
+        if pending := self._pending.pop(to, None):
+            task = self.hass.async_create_background_task(
+                self._async_send(to, pending), f"line_bot push to {to}"
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _async_send(self, to: str, pending: list[QueuedMessages]) -> None:
+        async with self._locks.setdefault(to, asyncio.Lock()):
+            for batch in to_batches(pending):
+                messages = [message for item in batch for message in item.messages]
+                try:
+                    result = await self.client.push_message(to, messages)
+                except Exception as err:  # pylint: disable=broad-except
+                    if isinstance(err, LineApiError) and not is_retryable(err):
+                        self._async_ack(item.record_id for item in batch)
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_exception(err)
+                else:
+                    self._async_ack(item.record_id for item in batch)
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_result(result)
+
+    @callback
+    def _async_ack(self, record_ids: Iterable[str | None]) -> None:
+        if self.outbox is None:
+            return
+        for record_id in record_ids:
+            if record_id is not None:
+                self.outbox.async_ack(record_id)
+
+
+def to_batches(pending: list[QueuedMessages]):
+    """Split queued items into batches of up to MAX_MESSAGES_PER_REQUEST messages.
+
+    Items are never split, so the messages of a single call stay together.
+    """
+    batch = []
+    size = 0
+    for item in pending:
+        if batch and size + len(item.messages) > MAX_MESSAGES_PER_REQUEST:
+            yield batch
+            batch = []
+            size = 0
+        batch.append(item)
+        size += len(item.messages)
+    if batch:
+        yield batch
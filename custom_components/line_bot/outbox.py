@@ -0,0 +1,157 @@
+"""Durable outbox for Line Bot integration."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any
+from uuid import uuid4
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+OUTBOX_WRITE_DELAY = 0.5
+OUTBOX_COMPACT_THRESHOLD = 1000
+
+
+class Outbox:
+    """Append-only log of messages that are not sent yet.
+
+    Adding or acknowledging a message appends a single line, and lines are
+    written to disk in batches, so the cost per message stays constant no
+    matter how many messages are pending. The log is rewritten with only the
+    pending messages once enough acknowledged lines have piled up.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, ttl: float) -> None:
+        """Initialize the outbox."""
+        self.hass = hass
+        self.ttl = ttl
+        self.path = hass.config.path(STORAGE_DIR, f"{DOMAIN}.outbox.{entry_id}")
+        self.pending: dict[str, dict[str, Any]] = {}
+        self._buffer: list[str] = []
+        self._garbage = 0
+        self._lock = asyncio.Lock()
+        self._unsub_write = None
+
+    async def async_load(self) -> list[dict[str, Any]]:
+        """Load the messages left from the last run, dropping expired ones."""
+        lines = await self.hass.async_add_executor_job(self._read)
+        now = time.time()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                _LOGGER.warning("Skipping corrupted outbox line in %s", self.path)
+                continue
+            if "ack" in record:
+                self.pending.pop(record["ack"], None)
+            elif record["expires"] > now:
+                self.pending[record["id"]] = record
+            else:
+                self.pending.pop(record["id"], None)
+
+        if len(lines) != len(self.pending):
+            await self.async_compact()
+        return list(self.pending.values())
+
+    @callback
+    def async_add(
+        self,
+        to: str | list[str],
+        messages: list[dict[str, Any]],
+        deferred: bool = False,
+    ) -> str:
+        """Add messages to the outbox and return the id of the record.
+
+        Deferred messages are held back until there is room in the message
+        quota, instead of being sent again after a restart.
+        """
+        record = {
+            "id": uuid4().hex,
+            "to": to,
+            "messages": messages,
+            "expires": time.time() + self.ttl,
+        }
+        if deferred:
+            record["deferred"] = True
+        self.pending[record["id"]] = record
+        self._append(record)
+        return record["id"]
+
+    @callback
+    def async_ack(self, record_id: str) -> None:
+        """Remove sent messages from the outbox."""
+        if self.pending.pop(record_id, None) is None:
+            return
+        self._append({"ack": record_id})
+        self._garbage += 2
+
+    async def async_flush(self) -> None:
+        """Write buffered lines to disk."""
+        if self._unsub_write:
+            self._unsub_write()
+            self._unsub_write = None
+        async with self._lock:
+            if self._garbage >= OUTBOX_COMPACT_THRESHOLD and self._garbage > len(
+                self.pending
+            ):
+                await self._async_compact()
+                return
+            lines, self._buffer = self._buffer, []
+            if lines:
+                await self.hass.async_add_executor_job(self._write, lines)
+
+    async def async_compact(self) -> None:
+        """Rewrite the log with only the pending messages."""
+        async with self._lock:
+            await self._async_compact()
+
+    async def _async_compact(self) -> None:
+        self._buffer = []
+        self._garbage = 0
+        lines = [json.dumps(record) + "\n" for record in self.pending.values()]
+        await self.hass.async_add_executor_job(self._rewrite, lines)
+
+    @callback
+    def _append(self, record: dict[str, Any]) -> None:
+        self._buffer.append(json.dumps(record) + "\n")
+        if self._unsub_write is None:
+            self._unsub_write = async_call_later(
+                self.hass, OUTBOX_WRITE_DELAY, self._async_write_later
+            )
+
+    async def _async_write_later(self, _now) -> None:
+        self._unsub_write = None
+        await self.async_flush()
+
+    def _read(self) -> list[str]:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return [line for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _write(self, lines: list[str]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _rewrite(self, lines: list[str]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,210 @@
+"""Profile cache for Line Bot integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from functools import partial
+import logging
+import time
+from typing import Any
+
+from aiohttp import ClientError
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .client import LineBotClient
+from .const import (
+    DOMAIN,
+    PROFILE_LOOKUP_TIMEOUT,
+    PROFILE_MISSING_TTL,
+    PROFILE_TTL,
+    PROFILES_SAVE_DELAY,
+    PROFILES_SIZE,
+)
+from .events import WebhookEvent
+from .exceptions import LineApiError
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+# Line answers these when the user blocked the bot, left the chat or never
+# was a friend, which won't change on the next message
+MISSING_STATUSES = (400, 404)
+
+
+class ProfileCache:
+    """Cache of user profiles and group summaries, kept across restarts.
+
+    Each one is requested from Line at most once per `ttl` seconds, and
+    concurrent lookups of the same one share a single request. Profiles Line
+    doesn't have are remembered as missing for `missing_ttl` seconds. The
+    least recently used entries are dropped beyond `maxsize`.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: LineBotClient,
+        entry_id: str,
+        maxsize: int = PROFILES_SIZE,
+        ttl: float = PROFILE_TTL,
+        missing_ttl: float = PROFILE_MISSING_TTL,
+    ) -> None:
+        """Initialize the cache."""
+        self.hass = hass
+        self.client = client
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.profiles.{entry_id}"
+        )
+        self._profiles: OrderedDict[str, tuple[float, dict[str, Any] | None]] = (
+            OrderedDict()
+        )
+        self._lookups: dict[str, asyncio.Task[dict[str, Any] | None]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of cached profiles, including missing ones."""
+        return len(self._profiles)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Return hit and miss statistics."""
+        total = self.hits + self.misses + self.merged
+        return {
+            "size": len(self._profiles),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "hit_rate": (self.hits + self.merged) / total if total else None,
+        }
+
+    async def async_load(self) -> None:
+        """Load the profiles saved by the last run, dropping expired ones."""
+        data = await self._store.async_load() or {}
+        now = time.time()
+        self._profiles = OrderedDict(
+            (key, (expires, profile))
+            for key, (expires, profile) in data.get("profiles", {}).items()
+            if expires > now
+        )
+
+    async def async_save(self) -> None:
+        """Save the profiles now, instead of after PROFILES_SAVE_DELAY."""
+        await self._store.async_save(self._data_to_save())
+
+    async def async_get_profile(self, user_id: str) -> dict[str, Any] | None:
+        """Get the profile of a user, or None if Line doesn't have it."""
+        return await self._async_get(
+            f"user/{user_id}", partial(self.client.get_profile, user_id)
+        )
+
+    async def async_get_member_profile(
+        self, chat_type: str, chat_id: str, user_id: str
+    ) -> dict[str, Any] | None:
+        """Get the profile of a member of a group or room."""
+        if chat_type == "group":
+            fetch = partial(self.client.get_group_member_profile, chat_id, user_id)
+        else:
+            fetch = partial(self.client.get_room_member_profile, chat_id, user_id)
+        return await self._async_get(f"{chat_type}/{chat_id}/{user_id}", fetch)
+
+    async def async_get_group_summary(self, group_id: str) -> dict[str, Any] | None:
+        """Get the name and picture of a group."""
+        return await self._async_get(
+            f"group/{group_id}", partial(self.client.get_group_summary, group_id)
+        )
+
+    async def async_enrich(self, event: WebhookEvent) -> dict[str, Any]:
+        """Look up the profile of the sender and the summary of the group.
+
+        Returns them as `user` and `group`, set to None when Line doesn't
+        have them. A lookup that failed is left out, and so is every lookup
+        after PROFILE_LOOKUP_TIMEOUT seconds. Those still fill the cache once
+        Line answers.
+        """
+        source_type = event.source_type
+        user_id = event.source.get("userId")
+        lookups: dict[str, Awaitable[dict[str, Any] | None]] = {}
+        if user_id and source_type == "user":
+            lookups["user"] = self.async_get_profile(user_id)
+        elif user_id and source_type in ("group", "room"):
+            lookups["user"] = self.async_get_member_profile(
+                source_type, event.chat_id, user_id
+            )
+        if source_type == "group":
+            lookups["group"] = self.async_get_group_summary(event.chat_id)
+
+        profiles = {}
+        try:
+            async with asyncio.timeout(PROFILE_LOOKUP_TIMEOUT):
+                results = await asyncio.gather(
+                    *lookups.values(), return_exceptions=True
+                )
+        except TimeoutError:
+            _LOGGER.warning("Timed out looking up profiles of %s", event.chat_id)
+            return profiles
+        for name, result in zip(lookups, results):
+            if isinstance(result, (LineApiError, ClientError, TimeoutError)):
+                _LOGGER.warning(
+                    "Failed to look up %s of %s: %s", name, event.chat_id, result
+                )
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                profiles[name] = result
+        return profiles
+
+    async def _async_get(
+        self, key: str, fetch: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> dict[str, Any] | None:
+        item = self._profiles.get(key)
+        if item is not None and item[0] > time.time():
+            self._profiles.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        if (lookup := self._lookups.get(key)) is None:
+            self.misses += 1
+            lookup = self._lookups[key] = self.hass.async_create_background_task(
+                self._async_fetch(key, fetch), f"line_bot profile {key}"
+            )
+            lookup.add_done_callback(lambda _: self._lookups.pop(key, None))
+        else:
+            self.merged += 1
+        return await asyncio.shield(lookup)
+
+    async def _async_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[dict[str, Any]]]
+    ) -> dict[str, Any] | None:
+        try:
+            profile: dict[str, Any] | None = await fetch()
+        except LineApiError as err:
+            if err.status_code not in MISSING_STATUSES:
+                raise
+            profile, ttl = None, self.missing_ttl
+        else:
+            profile.pop("request_id", None)
+            ttl = self.ttl
+        self._profiles[key] = (time.time() + ttl, profile)
+        self._profiles.move_to_end(key)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+        self._store.async_delay_save(self._data_to_save, PROFILES_SAVE_DELAY)
+        return profile
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        now = time.time()
+        return {
+            "profiles": {
+                key: item for key, item in self._profiles.items() if item[0] > now
+            }
+        }
@@ -0,0 +1,213 @@
+"""Sensors for Line Bot integration."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN
+from .coordinator import QuotaCoordinator
+from .metrics import Histogram
+
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+def latency_attributes(histogram: Histogram) -> dict[str, Any]:
+    """Get the percentiles of a latency histogram as state attributes."""
+    return {
+        "count": histogram.count,
+        "p50": histogram.quantile(0.5),
+        "p99": histogram.quantile(0.99),
+        "max": histogram.max,
+    }
+
+
+@dataclass(frozen=True, kw_only=True)
+class LineBotSensorEntityDescription(SensorEntityDescription):
+    """Describes a Line Bot sensor."""
+
+    value_fn: Callable[[dict[str, Any]], Any]
+    attributes_fn: Callable[[dict[str, Any]], dict[str, Any]] | None = None
+
+
+SENSORS: tuple[LineBotSensorEntityDescription, ...] = (
+    LineBotSensorEntityDescription(
+        key="sent_requests",
+        translation_key="sent_requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda data: data["metrics"].sent,
+        attributes_fn=lambda data: data["metrics"].as_dict()["requests"],
+    ),
+    LineBotSensorEntityDescription(
+        key="failed_requests",
+        translation_key="failed_requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda data: data["metrics"].failed,
+    ),
+    LineBotSensorEntityDescription(
+        key="send_latency",
+        translation_key="send_latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=0,
+        value_fn=lambda data: data["metrics"].send_latency.mean,
+        attributes_fn=lambda data: latency_attributes(data["metrics"].send_latency),
+    ),
+    LineBotSensorEntityDescription(
+        key="webhook_latency",
+        translation_key="webhook_latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=1,
+        value_fn=lambda data: data["metrics"].webhook_latency.mean,
+        attributes_fn=lambda data: latency_attributes(data["metrics"].webhook_latency),
+    ),
+    LineBotSensorEntityDescription(
+        key="handle_latency",
+        translation_key="handle_latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=1,
+        value_fn=lambda data: data["metrics"].handle_latency.mean,
+        attributes_fn=lambda data: latency_attributes(data["metrics"].handle_latency),
+    ),
+    LineBotSensorEntityDescription(
+        key="webhook_events",
+        translation_key="webhook_events",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda data: data["metrics"].webhook_events,
+    ),
+    LineBotSensorEntityDescription(
+        key="event_queue_depth",
+        translation_key="event_queue_depth",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda data: data["dispatcher"].queue.qsize(),
+        attributes_fn=lambda data: {"max_depth": data["dispatcher"].max_depth},
+    ),
+    LineBotSensorEntityDescription(
+        key="dropped_events",
+        translation_key="dropped_events",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda data: data["dispatcher"].dropped,
+    ),
+    LineBotSensorEntityDescription(
+        key="pending_messages",
+        translation_key="pending_messages",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda data: data["queue"].pending,
+    ),
+)
+
+QUOTA_SENSORS: tuple[LineBotSensorEntityDescription, ...] = (
+    LineBotSensorEntityDescription(
+        key="message_quota",
+        translation_key="message_quota",
+        native_unit_of_measurement="messages",
+        value_fn=lambda data: data["coordinator"].limit,
+    ),
+    LineBotSensorEntityDescription(
+        key="message_usage",
+        translation_key="message_usage",
+        native_unit_of_measurement="messages",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda data: data["coordinator"].usage,
+        attributes_fn=lambda data: {
+            "counted_since_poll": data["coordinator"].sent,
+            "near_limit": data["coordinator"].near_limit,
+            "deferred_messages": len(data["coordinator"].deferred),
+        },
+    ),
+    LineBotSensorEntityDescription(
+        key="remaining_messages",
+        translation_key="remaining_messages",
+        native_unit_of_measurement="messages",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda data: data["coordinator"].remaining,
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """Set up the sensors of a config entry."""
+    data = hass.data[DOMAIN]["entry"][entry.entry_id]
+    async_add_entities(
+        [
+            *(LineBotSensor(entry, data, description) for description in SENSORS),
+            *(
+                LineBotQuotaSensor(entry, data, description)
+                for description in QUOTA_SENSORS
+            ),
+        ]
+    )
+
+
+class LineBotSensor(SensorEntity):
+    """Sensor reading a metric of a config entry."""
+
+    entity_description: LineBotSensorEntityDescription
+    _attr_has_entity_name = True
+
+    def __init__(
+        self,
+        entry: ConfigEntry,
+        data: dict[str, Any],
+        description: LineBotSensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        self.entity_description = description
+        self.data = data
+        self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            name=entry.title,
+            entry_type=DeviceEntryType.SERVICE,
+        )
+
+    @property
+    def native_value(self) -> Any:
+        """Return the value of the metric."""
+        return self.entity_description.value_fn(self.data)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return details of the metric."""
+        if self.entity_description.attributes_fn is None:
+            return None
+        return self.entity_description.attributes_fn(self.data)
+
+
+class LineBotQuotaSensor(CoordinatorEntity[QuotaCoordinator], LineBotSensor):
+    """Sensor of the message quota, updated by the quota coordinator."""
+
+    def __init__(
+        self,
+        entry: ConfigEntry,
+        data: dict[str, Any],
+        description: LineBotSensorEntityDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(data["coordinator"])
+        LineBotSensor.__init__(self, entry, data, description)
@@ -1,33 +1,45 @@
 """Services for the Line Bot integration."""
 
-from functools import partial
+import asyncio
+from functools import cache
+import json
 import logging
+from types import ModuleType
+from typing import Any
 
-from linebot import LineBotApi
-from linebot.models import (
-    AudioSendMessage,
-    ButtonsTemplate,
-    ConfirmTemplate,
-    FlexSendMessage,
-    ImageSendMessage,
-    LocationSendMessage,
-    MessageAction,
-    PostbackAction,
-    StickerSendMessage,
-    TemplateSendMessage,
-    TextSendMessage,
-    URIAction,
-)
 import voluptuous as vol
 
-from homeassistant.const import CONF_ACCESS_TOKEN
-from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv, selector
 from homeassistant.helpers.typing import ConfigType
 
-from .const import CONF_ALLOWED_CHAT_IDS, CONF_CHAT_ID, DOMAIN
-from .exceptions import ChatIdNotFound
-from .helpers import get_config_entry
+from .cache import TTLCache
+from .client import to_json_dicts
+from .const import (
+    DOMAIN,
+    FLEX_TEMPLATE_CACHE_SIZE,
+    FLEX_TEMPLATE_CACHE_TTL,
+    MAX_MESSAGES_PER_REQUEST,
+    MESSAGE_CACHE_SIZE,
+    MESSAGE_CACHE_TTL,
+    MULTICAST_CHUNK_SIZE,
+)
+from .exceptions import LineApiError, MediaError
+from .flex import FlexTemplates, to_flex_messages
+from .helpers import (
+    get_client,
+    get_content_store,
+    get_data,
+    get_media_store,
+    select_channel,
+)
+from .media import VARIANT_ORIGINAL, VARIANT_PREVIEW
 
 QUERY_IMAGE_SCHEMA = vol.Schema(
     {
@@ -44,13 +56,17 @@ QUERY_IMAGE_SCHEMA = vol.Schema(
 )
 
 MESSAGES = {
-    "text": TextSendMessage,
-    "image": ImageSendMessage,
-    "sticker": StickerSendMessage,
-    "template": TemplateSendMessage,
-    "location": LocationSendMessage,
-    "flex": FlexSendMessage,
-    "audio": AudioSendMessage,
+    "text": "TextSendMessage",
+    "image": "ImageSendMessage",
+    "sticker": "StickerSendMessage",
+    "template": "TemplateSendMessage",
+    "location": "LocationSendMessage",
+    "flex": "FlexSendMessage",
+    "audio": "AudioSendMessage",
+}
+TEMPLATES = {
+    "buttons": "ButtonsTemplate",
+    "confirm": "ConfirmTemplate",
 }
 
 _LOGGER = logging.getLogger(__package__)
@@ -60,17 +76,26 @@ async def async_setup_services(hass: HomeAssistant, config: ConfigType) -> None:
     """Set up services for the Line Bot integration."""
 
     line_notification_service = LineNotificationService(hass)
+    message_cache = hass.data.setdefault(DOMAIN, {})["message_cache"] = TTLCache(
+        MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL
+    )
+    flex_templates = FlexTemplates(
+        hass, TTLCache(FLEX_TEMPLATE_CACHE_SIZE, FLEX_TEMPLATE_CACHE_TTL)
+    )
+    hass.data[DOMAIN]["flex_templates"] = flex_templates
 
     async def send_message(call: ServiceCall) -> ServiceResponse:
         """Send a message."""
         to = call.data.get("to")
         reply_token = call.data.get("reply_token")
         message = call.data.get("message")
-        message_type = message.get("type")
         return await line_notification_service.send_message(
-            MESSAGES[message_type].new_from_json_dict(message),
+            compile_message(message_cache, message),
             to=to,
             reply_token=reply_token,
+            priority=call.data.get("priority"),
+            channel=call.data.get("channel"),
+            spread=call.data.get("spread"),
         )
 
     async def send_button_message(call: ServiceCall) -> ServiceResponse:
@@ -80,11 +105,13 @@ async def async_setup_services(hass: HomeAssistant, config: ConfigType) -> None:
         text = call.data.get("text")
         alt_text = call.data.get("alt_text", text)
         buttons = call.data.get("buttons")
-        button_template = ButtonsTemplate(text=text, actions=to_actions(buttons))
         return await line_notification_service.send_message(
-            TemplateSendMessage(alt_text=alt_text, template=button_template),
+            compile_template_message(message_cache, "buttons", text, alt_text, buttons),
             to=to,
             reply_token=reply_token,
+            priority=call.data.get("priority"),
+            channel=call.data.get("channel"),
+            spread=call.data.get("spread"),
         )
 
     async def send_confirm_message(call: ServiceCall) -> ServiceResponse:
@@ -94,16 +121,147 @@ async def async_setup_services(hass: HomeAssistant, config: ConfigType) -> None:
         text = call.data.get("text")
         alt_text = call.data.get("altText", text)
         buttons = call.data.get("buttons")
-        confirm_template = ConfirmTemplate(text=text, actions=to_actions(buttons))
         return await line_notification_service.send_message(
-            TemplateSendMessage(alt_text=alt_text, template=confirm_template),
+            compile_template_message(message_cache, "confirm", text, alt_text, buttons),
             to=to,
             reply_token=reply_token,
+            priority=call.data.get("priority"),
+            channel=call.data.get("channel"),
+            spread=call.data.get("spread"),
+        )
+
+    async def send_flex_from_template(call: ServiceCall) -> ServiceResponse:
+        """Send Flex messages rendered from a template."""
+        reply_token = call.data.get("reply_token")
+        bubbles = flex_templates.async_render(
+            call.data.get("template"), call.data.get("variables")
+        )
+        messages = to_flex_messages(call.data.get("alt_text"), bubbles)
+        if reply_token and len(messages) > MAX_MESSAGES_PER_REQUEST:
+            raise HomeAssistantError(
+                f"Flex template rendered {len(messages)} messages, "
+                f"but a reply can only have {MAX_MESSAGES_PER_REQUEST}"
+            )
+        result = None
+        for i in range(0, len(messages), MAX_MESSAGES_PER_REQUEST):
+            result = await line_notification_service.send_message(
+                messages[i : i + MAX_MESSAGES_PER_REQUEST],
+                to=call.data.get("to"),
+                reply_token=reply_token,
+                priority=call.data.get("priority"),
+                channel=call.data.get("channel"),
+                spread=call.data.get("spread"),
+            )
+        return result
+
+    async def send_image(call: ServiceCall) -> ServiceResponse:
+        """Send a local image file."""
+        media_store = get_media_store(hass)
+        media = await media_store.async_get(call.data.get("path"))
+        return await line_notification_service.send_message(
+            {
+                "type": "image",
+                "originalContentUrl": media_store.sign_url(media, VARIANT_ORIGINAL),
+                "previewImageUrl": media_store.sign_url(media, VARIANT_PREVIEW),
+            },
+            to=call.data.get("to"),
+            reply_token=call.data.get("reply_token"),
+            priority=call.data.get("priority"),
+            channel=call.data.get("channel"),
+            spread=call.data.get("spread"),
+        )
+
+    async def send_audio(call: ServiceCall) -> ServiceResponse:
+        """Send a local audio file."""
+        media_store = get_media_store(hass)
+        media = await media_store.async_get(call.data.get("path"))
+        duration = call.data.get("duration", media.duration)
+        if duration is None:
+            raise MediaError(
+                f"Cannot read the duration of {media.path}, please give duration"
+            )
+        return await line_notification_service.send_message(
+            {
+                "type": "audio",
+                "originalContentUrl": media_store.sign_url(media, VARIANT_ORIGINAL),
+                "duration": duration,
+            },
+            to=call.data.get("to"),
+            reply_token=call.data.get("reply_token"),
+            priority=call.data.get("priority"),
+            channel=call.data.get("channel"),
+            spread=call.data.get("spread"),
+        )
+
+    async def send_multicast(call: ServiceCall) -> ServiceResponse:
+        """Send a message to multiple chats."""
+        return await line_notification_service.send_multicast(
+            to_messages(message_cache, call.data.get("message")),
+            call.data.get("to"),
+            channel=call.data.get("channel"),
+            spread=call.data.get("spread"),
+            priority=call.data.get("priority"),
+        )
+
+    async def send_broadcast(call: ServiceCall) -> ServiceResponse:
+        """Send a message to every friend of the bot."""
+        client = get_client(hass, call.data.get("channel"))
+        return await client.broadcast(
+            to_messages(message_cache, call.data.get("message"))
+        )
+
+    async def send_narrowcast(call: ServiceCall) -> ServiceResponse:
+        """Send a message to friends matching a recipient and filter."""
+        client = get_client(hass, call.data.get("channel"))
+        return await client.narrowcast(
+            to_messages(message_cache, call.data.get("message")),
+            recipient=call.data.get("recipient"),
+            filter=call.data.get("filter"),
+            limit=call.data.get("limit"),
         )
 
+    async def get_message_content(call: ServiceCall) -> ServiceResponse:
+        """Download the content of an image, video, audio or file message."""
+        message_id = call.data.get("message_id")
+        return {
+            "message_id": message_id,
+            "path": await get_content_store(hass, call.data.get("channel")).async_get(
+                message_id
+            ),
+        }
+
     hass.services.async_register(DOMAIN, "send_message", send_message)
     hass.services.async_register(DOMAIN, "send_button_message", send_button_message)
     hass.services.async_register(DOMAIN, "send_confirm_message", send_confirm_message)
+    hass.services.async_register(
+        DOMAIN, "send_flex_from_template", send_flex_from_template
+    )
+    hass.services.async_register(DOMAIN, "send_image", send_image)
+    hass.services.async_register(DOMAIN, "send_audio", send_audio)
+    hass.services.async_register(
+        DOMAIN,
+        "send_multicast",
+        send_multicast,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "send_broadcast",
+        send_broadcast,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "send_narrowcast",
+        send_narrowcast,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        "get_message_content",
+        get_message_content,
+        supports_response=SupportsResponse.ONLY,
+    )
     return True
 
 
@@ -114,36 +272,153 @@ class LineNotificationService:
         """Initialize the service."""
         self.hass = hass
 
-    def get_line_bot_api(self):
-        """Get the Line Bot API."""
-        data = get_config_entry(self.hass).data
-        return LineBotApi(data[CONF_ACCESS_TOKEN])
-
-    def get_allowed_chat_ids(self):
-        """Get the allowed chat IDs."""
-        config_entry_data = get_config_entry(self.hass).data
-        return config_entry_data.get(CONF_ALLOWED_CHAT_IDS, {})
-
     async def send_message(self, message, **kwargs):
-        """Send a message."""
+        """Send a message.
+
+        Without a reply token, a message to a chat replies to the latest event
+        of the chat while its reply token is valid, since replies don't count
+        toward the message quota. Otherwise, the message is pushed.
+        """
         reply_token = kwargs.get("reply_token")
         if reply_token:
-            return await self.hass.loop.run_in_executor(
-                None,
-                partial(self.get_line_bot_api().reply_message, reply_token, message),
-            )
+            data = get_data(self.hass, kwargs.get("channel"))
+            forget_reply_token(data["reply_tokens"], reply_token)
+            return await data["client"].reply_message(reply_token, message)
 
-        to = self.get_allowed_chat_ids().get(kwargs.get("to"), {}).get(CONF_CHAT_ID)
-        if to is None:
-            raise ChatIdNotFound(kwargs.get("to"), self.get_allowed_chat_ids())
-        return await self.hass.loop.run_in_executor(
-            None,
-            partial(self.get_line_bot_api().push_message, to, message),
+        data, to = select_channel(
+            self.hass, kwargs.get("to"), kwargs.get("channel"), kwargs.get("spread")
         )
+        if reply_token := data["reply_tokens"].pop(to):
+            try:
+                return await data["client"].reply_message(reply_token, message)
+            except LineApiError as err:
+                if err.status_code != 400:
+                    raise
+                _LOGGER.debug("Reply token of %s is not valid: %s, pushing", to, err)
+        return await self._async_send(data, to, message, kwargs.get("priority"))
+
+    async def send_multicast(
+        self, messages, names, channel=None, spread=None, priority=None
+    ) -> ServiceResponse:
+        """Send messages to many chats at once.
+
+        Each chat is sent through a channel picked as for a push. Users are
+        sent in concurrent multicast requests of up to MULTICAST_CHUNK_SIZE
+        recipients per channel. Groups and rooms can't be multicast to, so
+        they are pushed concurrently alongside. Like pushes, multicasts go
+        through the outbox and can be deferred.
+        """
+        recipients: dict[str, tuple[dict[str, Any], dict[str, None]]] = {}
+        for name in cv.ensure_list(names):
+            data, chat_id = select_channel(self.hass, name, channel, spread)
+            recipients.setdefault(data["entry_id"], (data, {}))[1][chat_id] = None
+
+        targets = []
+        requests = []
+        for entry_id, (data, chat_ids) in recipients.items():
+            user_ids = [chat_id for chat_id in chat_ids if chat_id.startswith("U")]
+            for i in range(0, len(user_ids), MULTICAST_CHUNK_SIZE):
+                chunk = user_ids[i : i + MULTICAST_CHUNK_SIZE]
+                targets.append((entry_id, chunk))
+                requests.append(self._async_send(data, chunk, messages, priority))
+            for chat_id in chat_ids:
+                if not chat_id.startswith("U"):
+                    targets.append((entry_id, [chat_id]))
+                    requests.append(self._async_send(data, chat_id, messages, priority))
+
+        results = []
+        errors = []
+        for (entry_id, chunk), result in zip(
+            targets, await asyncio.gather(*requests, return_exceptions=True)
+        ):
+            if isinstance(result, Exception):
+                _LOGGER.error("Failed to send to %s: %s", chunk, result)
+                errors.append(result)
+                results.append({"to": chunk, "channel": entry_id, "error": str(result)})
+            else:
+                results.append({"to": chunk, "channel": entry_id, "response": result})
+
+        if errors and len(errors) == len(results):
+            raise HomeAssistantError(f"Failed to send multicast: {errors[0]}")
+        return {"results": results}
+
+    async def _async_send(
+        self,
+        data: dict[str, Any],
+        to: str | list[str],
+        messages,
+        priority: str | None,
+    ) -> dict[str, Any]:
+        """Send through the queue of a channel, or defer for the message quota."""
+        coordinator = data["coordinator"]
+        if coordinator.async_should_defer(priority):
+            _LOGGER.info("Message quota is almost used up, deferring message to %s", to)
+            coordinator.async_defer(to, to_json_dicts(messages))
+            return {"deferred": True}
+        return await data["queue"].async_send(to, messages)
+
+
+def forget_reply_token(reply_tokens: TTLCache, reply_token: str) -> None:
+    """Forget a reply token used explicitly, so sends to its chat don't reuse it."""
+    for chat_id, token in reply_tokens.items():
+        if token == reply_token:
+            reply_tokens.pop(chat_id)
+            return
+
+
+@cache
+def get_models() -> ModuleType:
+    """Import the message models of line-bot-sdk on first use.
+
+    Importing any part of the SDK loads the whole package, so it is kept out
+    of startup.
+    """
+    from linebot import models  # pylint: disable=import-outside-toplevel
+
+    return models
+
+
+def compile_message(cache: TTLCache, message: dict) -> dict:
+    """Convert a message to its json dict, reusing the result for equal messages.
+
+    Building the SDK model validates and normalizes the message, and only
+    has to be done once for messages sent over and over.
+    """
+    key = json.dumps(message, sort_keys=True, default=str)
+    if (compiled := cache.get(key)) is None:
+        message_class = getattr(get_models(), MESSAGES[message.get("type")])
+        compiled = message_class.new_from_json_dict(message)
+        compiled = compiled.as_json_dict()
+        cache.set(key, compiled)
+    return compiled
+
+
+def compile_template_message(
+    cache: TTLCache, template_type: str, text: str, alt_text: str, buttons
+) -> dict:
+    """Build the json dict of a buttons or confirm message, reusing earlier results."""
+    key = json.dumps(
+        [template_type, text, alt_text, buttons], sort_keys=True, default=str
+    )
+    if (compiled := cache.get(key)) is None:
+        models = get_models()
+        template_class = getattr(models, TEMPLATES[template_type])
+        compiled = models.TemplateSendMessage(
+            alt_text=alt_text,
+            template=template_class(text=text, actions=to_actions(buttons)),
+        ).as_json_dict()
+        cache.set(key, compiled)
+    return compiled
+
+
+def to_messages(cache: TTLCache, message):
+    """Convert a message or a list of messages to json dicts."""
+    return [compile_message(cache, item) for item in cv.ensure_list(message)]
 
 
 def to_actions(buttons):
     """Convert a list of buttons to a list of actions."""
+    models = get_models()
     actions = []
     for button in buttons:
         action = None
@@ -152,12 +427,12 @@ def to_actions(buttons):
         uri = button.get("uri")
         if data is not None:
             label = button.get("label", text)
-            action = PostbackAction(label=label, data=data)
+            action = models.PostbackAction(label=label, data=data)
         elif uri is not None:
             label = button.get("label", text)
-            action = URIAction(label=label, uri=uri)
+            action = models.URIAction(label=label, uri=uri)
         else:
             label = button.get("label", text)
-            action = MessageAction(label=label, text=text)
+            action = models.MessageAction(label=label, text=text)
         actions.append(action)
     return actions